@@ -5,18 +5,139 @@ Each backend handles code generation, compilation, and testing for a specific ta
 """
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import json
+import os
+import py_compile
+import queue
+import re
+import shutil
 import subprocess
 import sys
-import tempfile
-import textwrap
+import threading
+import weakref
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Iterable, List, Optional, Tuple
 
-from llm_session import LLMSession, Role
+from llm_session import LLMSession
 from processors import Interface, OutputType, TestPlan
 
+# A fenced block: its language tag, and its body up to the closing fence (or
+# the end of an unterminated response).
+_FENCE_RE = re.compile(
+    r"^[ \t]*```[ \t]*(\w*)[^\n]*\n(.*?)(?:^[ \t]*```[ \t]*$|\Z)",
+    re.DOTALL | re.MULTILINE)
+_PYTEST_SUMMARY_RE = re.compile(r"(\d+) (passed|failed|errors?)\b")
+_OPEN_FENCE_RE = re.compile(r"^[ \t]*```(?:python|py)[ \t]*\n", re.MULTILINE)
+_CLOSE_FENCE_RE = re.compile(r"^[ \t]*```[ \t]*\n", re.MULTILINE)
+# Below this many tests, xdist worker startup costs more than it saves
+_XDIST_MIN_TESTS = 100
+
+
+# Fixed text of the source-generation prompts, assembled around the spec,
+# interface and error context by PythonBackend. Built once at import.
+_EXECUTABLE_PROMPT_HEAD = """Generate Python code for this console application specification.
+
+Specification:
+"""
+
+_LIBRARY_PROMPT_HEAD = """Generate Python code for this library specification.
+
+Specification:
+"""
+
+_PROMPT_INTERFACE = """
+
+Interface to implement:
+"""
+
+_EXECUTABLE_PROMPT_TAIL = """
+
+Requirements:
+1. Use argparse for command line argument parsing
+2. Include a main() function and if __name__ == "__main__" block
+3. Handle all specified arguments, stdin/stdout as per the interface
+4. Return appropriate exit codes
+5. Include proper error handling
+6. Make it a complete, runnable script
+7. Use Python 3.10+ features if helpful
+8. Include docstrings
+
+Return ONLY the Python code, no explanations.
+"""
+
+_LIBRARY_PROMPT_TAIL = """
+
+Requirements:
+1. Implement all types, functions, and methods from the interface
+2. Use dataclasses or regular classes as appropriate
+3. Include type hints
+4. Include docstrings
+5. Implement operator overloads where specified
+6. Make it importable as a module
+7. Use Python 3.10+ features if helpful
+
+Return ONLY the Python code, no explanations.
+"""
+
+# Long-lived pytest process, so each test run doesn't pay for interpreter
+# startup and importing pytest. Reads one JSON command per line on stdin
+# and answers with one JSON line on the original stdout; fd 1 is pointed at
+# stderr (discarded) so stray writes from tests can't corrupt the protocol.
+_PYTEST_WORKER = r"""
+import contextlib, io, json, os, sys
+import pytest
+
+commands = sys.stdin
+replies = os.fdopen(os.dup(1), 'w')
+os.dup2(2, 1)
+
+for line in iter(commands.readline, ''):
+    command = json.loads(line)
+    source_dir = command['source_dir']
+    # Forget modules from the previous iteration so the new code is imported
+    roots = tuple(os.path.join(os.path.abspath(d), '')
+                  for d in (source_dir, os.path.dirname(command['test_path'])))
+    for name, module in list(sys.modules.items()):
+        if (getattr(module, '__file__', None) or '').startswith(roots):
+            del sys.modules[name]
+    if source_dir not in sys.path:
+        sys.path.insert(0, source_dir)
+    os.chdir(source_dir)
+
+    out, err = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            returncode = int(pytest.main(command['args']))
+        except BaseException as e:
+            print(f'pytest crashed: {e!r}', file=sys.stderr)
+            returncode = 3
+    replies.write(json.dumps({'returncode': returncode,
+                              'stdout': out.getvalue(),
+                              'stderr': err.getvalue()}) + '\n')
+    replies.flush()
+"""
+
+
+def _read_worker_replies(stdout, replies: queue.Queue) -> None:
+    """Forward worker reply lines to a queue; None marks end of stream."""
+    for line in stdout:
+        replies.put(line)
+    replies.put(None)
+
+
+def _stop_worker(process: subprocess.Popen) -> None:
+    """Shut a pytest worker down, killing it if it doesn't exit promptly."""
+    try:
+        process.stdin.close()
+        process.wait(timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        process.kill()
+        process.wait()
+
 
 @dataclass
 class BuildResult:
@@ -85,6 +206,21 @@ class Backend(ABC):
         """
         pass
 
+    async def agenerate_code(
+        self,
+        spec_content: str,
+        interface: Interface,
+        test_plan: TestPlan,
+        previous_error: Optional[str] = None,
+    ) -> Tuple[str, str]:
+        """
+        Async counterpart of generate_code.
+
+        Runs generate_code on a worker thread unless a backend overrides it.
+        """
+        return await asyncio.to_thread(self.generate_code, spec_content,
+                                       interface, test_plan, previous_error)
+
     @abstractmethod
     def build(self, source_path: Path, output_path: Path) -> BuildResult:
         """
@@ -100,13 +236,17 @@ class Backend(ABC):
         pass
 
     @abstractmethod
-    def run_tests(self, test_path: Path, source_path: Path) -> TestResult:
+    def run_tests(self,
+                  test_path: Path,
+                  source_path: Path,
+                  test_count: int = 0) -> TestResult:
         """
         Run the generated tests.
         
         Args:
             test_path: Path to test code
             source_path: Path to source code being tested
+            test_count: Number of planned tests (used to size timeouts)
             
         Returns:
             TestResult with pass/fail counts and errors
@@ -123,6 +263,17 @@ class PythonBackend(Backend):
     - Generates Python 3.10+ compatible code
     """
 
+    def __init__(self, session: LLMSession, build_dir: Path):
+        super().__init__(session, build_dir)
+        # Environment for pytest runs; only PYTHONPATH varies per call.
+        self._test_env = os.environ.copy()
+        # Large suites are spread over all cores if pytest-xdist is installed
+        self._has_xdist = importlib.util.find_spec("xdist") is not None
+        self._worker = None
+        self._worker_replies = None
+        self._worker_finalizer = None
+        self._start_worker()
+
     @property
     def name(self) -> str:
         return "Python"
@@ -157,16 +308,13 @@ Fix this error in your generated code.
             source_prompt = self._get_library_prompt(spec_content, interface,
                                                      error_context)
 
-        source_code = self.session.chat(source_prompt)
-        source_code = self._extract_code_block(source_code)
+        source_code = self._extract_streamed_code_block(
+            self.session.stream_chat(source_prompt))
 
         # Generate test code
-        test_prompt = f"""Generate pytest tests for this Python code.
-
-Source code:
-```python
-{source_code}
-```
+        # Stable context first and the freshly generated source last, so
+        # repeated iterations share as long a prompt prefix as possible.
+        test_prompt = f"""Generate pytest tests for the Python code below.
 
 Interface:
 {interface.to_json()}
@@ -182,97 +330,106 @@ Requirements:
 5. Handle both success and error cases
 6. Make tests runnable standalone
 
-Return ONLY the Python test code, no explanations."""
+Return ONLY the Python test code, no explanations.
+
+Source code:
+```python
+{source_code}
+```"""
 
-        test_code = self.session.chat(test_prompt)
-        test_code = self._extract_code_block(test_code)
+        test_code = self._extract_streamed_code_block(
+            self.session.stream_chat(test_prompt))
 
         return source_code, test_code
 
+    # error_context is the only part of these prompts that changes between
+    # iterations, so it goes last to keep the prefix cacheable by the API.
+
     def _get_executable_prompt(self, spec_content: str, interface: Interface,
                                error_context: str) -> str:
-        return f"""Generate Python code for this console application specification.
-
-Specification:
-{spec_content}
-
-Interface to implement:
-{interface.to_json()}
-{error_context}
-Requirements:
-1. Use argparse for command line argument parsing
-2. Include a main() function and if __name__ == "__main__" block
-3. Handle all specified arguments, stdin/stdout as per the interface
-4. Return appropriate exit codes
-5. Include proper error handling
-6. Make it a complete, runnable script
-7. Use Python 3.10+ features if helpful
-8. Include docstrings
-
-Return ONLY the Python code, no explanations."""
+        return "".join((_EXECUTABLE_PROMPT_HEAD, spec_content,
+                        _PROMPT_INTERFACE, interface.to_json(),
+                        _EXECUTABLE_PROMPT_TAIL, error_context))
 
     def _get_library_prompt(self, spec_content: str, interface: Interface,
                             error_context: str) -> str:
-        return f"""Generate Python code for this library specification.
-
-Specification:
-{spec_content}
+        return "".join((_LIBRARY_PROMPT_HEAD, spec_content, _PROMPT_INTERFACE,
+                        interface.to_json(), _LIBRARY_PROMPT_TAIL,
+                        error_context))
 
-Interface to implement:
-{interface.to_json()}
-{error_context}
-Requirements:
-1. Implement all types, functions, and methods from the interface
-2. Use dataclasses or regular classes as appropriate
-3. Include type hints
-4. Include docstrings
-5. Implement operator overloads where specified
-6. Make it importable as a module
-7. Use Python 3.10+ features if helpful
+    def _extract_streamed_code_block(self, chunks: Iterable[str]) -> str:
+        """
+        Read a streamed response up to the end of its first python block.
 
-Return ONLY the Python code, no explanations."""
+        The stream is closed as soon as the closing fence arrives, so any
+        trailing explanation isn't waited for. If no complete block turns
+        up, falls back to _extract_code_block on the whole response.
+        """
+        response = ""
+        body_start = -1
+        try:
+            for chunk in chunks:
+                # Fences may straddle chunks, so rescan a little overlap.
+                scan_from = max(len(response) - 16, 0)
+                response += chunk
+
+                if body_start < 0:
+                    opening = _OPEN_FENCE_RE.search(response, scan_from)
+                    if not opening:
+                        continue
+                    body_start = scan_from = opening.end()
+
+                closing = _CLOSE_FENCE_RE.search(response,
+                                                 max(scan_from, body_start))
+                if closing:
+                    return response[body_start:closing.start()].rstrip('\n')
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+        return self._extract_code_block(response)
 
     def _extract_code_block(self, response: str) -> str:
-        """Extract Python code from markdown code blocks if present."""
-        lines = response.split('\n')
-        in_code_block = False
-        code_lines = []
-
-        for line in lines:
-            if line.strip().startswith('```python') or line.strip() == '```py':
-                in_code_block = True
-                continue
-            elif line.strip() == '```' and in_code_block:
-                in_code_block = False
-                continue
-            elif in_code_block:
-                code_lines.append(line)
-
-        if code_lines:
-            return '\n'.join(code_lines)
+        """
+        Extract Python code from the markdown code blocks in a response.
 
-        # No code block found, assume entire response is code
-        # But strip any leading/trailing markdown
-        response = response.strip()
-        if response.startswith('```'):
-            # Remove first line
-            response = '\n'.join(response.split('\n')[1:])
-        if response.endswith('```'):
-            response = response[:-3]
+        All python/py blocks are joined. Untagged blocks are used only if
+        there are none, and blocks in other languages never are.
+        """
+        python_blocks = []
+        untagged_blocks = []
+        for m in _FENCE_RE.finditer(response):
+            tag = m.group(1).lower()
+            if tag in ("python", "py"):
+                python_blocks.append(m.group(2).rstrip())
+            elif not tag:
+                untagged_blocks.append(m.group(2).rstrip())
+
+        blocks = python_blocks or untagged_blocks
+        if blocks:
+            return '\n'.join(blocks)
 
-        return response.strip()
+        # No code block found, assume entire response is code
+        return response.strip().strip('`').strip()
 
     def build(self, source_path: Path, output_path: Path) -> BuildResult:
         """
         Python 'build' - just syntax check and copy.
         """
         try:
-            # Syntax check by compiling
-            source_code = source_path.read_text(encoding='utf-8')
-            compile(source_code, str(source_path), 'exec')
-
-            # Copy to output
-            output_path.write_text(source_code, encoding='utf-8')
+            # Syntax check by byte-compiling. The .pyc lands in __pycache__
+            # beside the source, which is where the tests import it from, so
+            # the test run doesn't compile it again. Hash-checked so a
+            # same-sized rewrite within the mtime resolution isn't stale.
+            py_compile.compile(
+                str(source_path),
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+
+            # Copy to output. copyfile uses sendfile/copy_file_range where
+            # available rather than decoding and re-encoding the text.
+            shutil.copyfile(source_path, output_path)
 
             # Make executable on Unix
             if sys.platform != 'win32':
@@ -280,18 +437,90 @@ Return ONLY the Python code, no explanations."""
 
             return BuildResult(success=True, output_path=output_path)
 
-        except SyntaxError as e:
-            return BuildResult(
-                success=False,
-                error_message=f"Syntax error at line {e.lineno}: {e.msg}",
-            )
+        except py_compile.PyCompileError as e:
+            error = e.exc_value
+            if isinstance(error, SyntaxError):
+                message = f"Syntax error at line {error.lineno}: {error.msg}"
+            else:
+                message = e.msg
+            return BuildResult(success=False, error_message=message)
         except Exception as e:
             return BuildResult(
                 success=False,
                 error_message=str(e),
             )
 
-    def run_tests(self, test_path: Path, source_path: Path) -> TestResult:
+    def _start_worker(self) -> None:
+        """Spawn the persistent pytest worker, if possible."""
+        try:
+            self._worker = subprocess.Popen(
+                [sys.executable, '-u', '-c', _PYTEST_WORKER],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                env=self._test_env)
+        except OSError:
+            self._worker = None
+            return
+
+        self._worker_replies = queue.Queue()
+        threading.Thread(target=_read_worker_replies,
+                         args=(self._worker.stdout, self._worker_replies),
+                         daemon=True).start()
+        self._worker_finalizer = weakref.finalize(self, _stop_worker,
+                                                  self._worker)
+
+    def close(self) -> None:
+        """Stop the pytest worker."""
+        if self._worker_finalizer:
+            self._worker_finalizer()
+        self._worker = None
+
+    def _run_in_worker(self, args: List[str], test_path: Path,
+                       source_dir: Path,
+                       timeout: float) -> Optional[Tuple[int, str, str]]:
+        """
+        Run pytest in the warm worker.
+
+        Returns (returncode, stdout, stderr), or None if the worker is gone,
+        in which case the caller should run pytest the slow way instead.
+        Raises subprocess.TimeoutExpired if the run takes too long; the
+        worker is killed and a fresh one started for the next call.
+        """
+        if self._worker is None or self._worker.poll() is not None:
+            return None
+
+        command = {
+            'args': args,
+            'test_path': str(test_path),
+            'source_dir': str(source_dir),
+        }
+        try:
+            self._worker.stdin.write(json.dumps(command) + '\n')
+            self._worker.stdin.flush()
+            reply = self._worker_replies.get(timeout=timeout)
+        except OSError:
+            reply = None
+        except queue.Empty:
+            self.close()
+            self._start_worker()
+            raise subprocess.TimeoutExpired(args, timeout)
+
+        if reply is None:
+            # Worker died (e.g. a test called os._exit); use a fresh one next
+            # time and let this run fall back to a plain subprocess.
+            self.close()
+            self._start_worker()
+            return None
+
+        reply = json.loads(reply)
+        return reply['returncode'], reply['stdout'], reply['stderr']
+
+    def run_tests(self,
+                  test_path: Path,
+                  source_path: Path,
+                  test_count: int = 0) -> TestResult:
         """Run pytest on the generated tests."""
 
         # Ensure source is importable by putting it in the same directory
@@ -299,39 +528,53 @@ Return ONLY the Python code, no explanations."""
         source_dir = source_path.parent
         test_dir = test_path.parent
 
+        self._test_env['PYTHONPATH'] = str(source_dir)
+        timeout = max(60, 30 + 5 * test_count)
+
+        # Quiet output: failures and tracebacks, then one summary line
+        args = [str(test_path), '-q', '--tb=short', '-p', 'no:cacheprovider']
+
         try:
-            # Run pytest with verbose output
-            result = subprocess.run([
-                sys.executable, '-m', 'pytest',
-                str(test_path), '-v', '--tb=short'
-            ],
-                                    capture_output=True,
-                                    text=True,
-                                    timeout=60,
-                                    cwd=str(source_dir),
-                                    env={
-                                        **dict(subprocess.os.environ),
-                                        'PYTHONPATH':
-                                        str(source_dir),
-                                    })
-
-            stdout = result.stdout
-            stderr = result.stderr
-
-            # Parse pytest output
-            passed = stdout.count(' PASSED')
-            failed = stdout.count(' FAILED')
+            if self._has_xdist and test_count >= _XDIST_MIN_TESTS:
+                # xdist starts a cold interpreter per core, which only pays
+                # off for a big suite, and can't run in the warm worker
+                args += ['-n', 'auto']
+                outcome = None
+            else:
+                outcome = self._run_in_worker(args, test_path, source_dir,
+                                              timeout)
+            if outcome is None:
+                result = subprocess.run(
+                    [sys.executable, '-m', 'pytest', *args],
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                    cwd=str(source_dir),
+                    env=self._test_env)
+                outcome = result.returncode, result.stdout, result.stderr
+
+            returncode, stdout, stderr = outcome
+
+            # Parse the pytest summary, e.g. "2 failed, 5 passed in 0.1s"
+            summary = stdout.rstrip().rpartition('\n')[2]
+            counts = {
+                kind: int(n)
+                for n, kind in _PYTEST_SUMMARY_RE.findall(summary)
+            }
+            passed = counts.get('passed', 0)
+            failed = counts.get('failed', 0) + counts.get(
+                'error', 0) + counts.get('errors', 0)
             errors = []
 
-            if failed > 0 or result.returncode != 0:
+            if failed > 0 or returncode != 0:
                 # Extract failure info
-                if 'FAILED' in stdout:
+                if failed > 0:
                     errors.append(stdout)
                 if stderr:
                     errors.append(stderr)
 
             return TestResult(
-                success=(result.returncode == 0),
+                success=(returncode == 0),
                 passed=passed,
                 failed=failed,
                 errors=errors,
@@ -342,7 +585,7 @@ Return ONLY the Python code, no explanations."""
         except subprocess.TimeoutExpired:
             return TestResult(
                 success=False,
-                errors=["Test execution timed out (60s limit)"],
+                errors=[f"Test execution timed out ({timeout}s limit)"],
             )
         except Exception as e:
             return TestResult(
@@ -351,6 +594,22 @@ Return ONLY the Python code, no explanations."""
             )
 
 
+BACKEND_EXTENSIONS = {
+    "python": ".py",
+    "py": ".py",
+}
+
+
+def default_extension_for_backend(name: str) -> str:
+    """Output file extension used for a backend when none is given."""
+    extension = BACKEND_EXTENSIONS.get(name.lower())
+    if not extension:
+        raise ValueError(
+            f"Unknown backend: {name}. Available: {list(BACKEND_EXTENSIONS.keys())}"
+        )
+    return extension
+
+
 def get_backend(
     name: str,
     session: LLMSession,
@@ -8,27 +8,33 @@ Compiles .gistpp files into executables or libraries using LLM-powered code gene
 from __future__ import annotations
 
 import argparse
+import asyncio
 import hashlib
 import json
+import os
+import shutil
 import sys
 import tempfile
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
-from backends import Backend, BuildResult, TestResult, get_backend, infer_backend_from_output
-from llm_session import LLMConfig, LLMError
+from backends import (
+    default_extension_for_backend,
+    get_backend,
+    infer_backend_from_output,
+)
+from llm_session import LLMConfig, LLMError, RequestMeter
 from markdown_db import MarkdownDocument
-from openai_session import OpenAIChatSession
+from openai_session import AsyncOpenAI, OpenAI, OpenAIChatSession
 from processors import (
     Interface,
     OutputType,
     Processor,
     TestPlan,
-    ConsoleApplicationProcessor,
-    LibraryProcessor,
     get_processor,
 )
+import structured_cache
 
 
 @dataclass
@@ -61,10 +67,77 @@ class CompileResult:
             self.warnings = []
 
 
-def compute_input_hash(input_path: Path) -> str:
-    """Compute hash of input file for caching."""
-    content = input_path.read_text(encoding='utf-8')
-    return hashlib.sha256(content.encode()).hexdigest()[:16]
+def compute_input_hash(content: str | bytes) -> str:
+    """Compute hash of input file content for caching."""
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def compute_cache_key(spec_hash: str, model: str, backend_name: str,
+                      interface_hash: str, tests_hash: str) -> str:
+    """
+    Content-address a build: the spec, the .interface and .tests files it
+    was built alongside, plus the 'compiler' identity.
+    """
+    # NUL-separated, so e.g. ("gpt-4", "opython") and ("gpt-4o", "python")
+    # can't collide
+    return hashlib.sha256("\0".join(
+        (spec_hash, model, backend_name, interface_hash,
+         tests_hash)).encode()).hexdigest()
+
+
+def compute_artifact_hashes(input_path: Path) -> tuple[str, str]:
+    """Hashes of the .interface and .tests files beside input_path."""
+    hashes = []
+    for suffix in ('.interface', '.tests'):
+        try:
+            hashes.append(
+                compute_input_hash(input_path.with_suffix(suffix).read_bytes()))
+        except OSError:
+            hashes.append("")  # Not generated yet
+    return hashes[0], hashes[1]
+
+
+def load_cached_build(
+        cache_dir: Path,
+        output_path: Path) -> Optional[tuple[Interface, TestPlan]]:
+    """
+    Restore a previously successful build from the cache.
+
+    Copies the cached output to `output_path` and returns the interface and
+    test plan it was built from, or None on a cache miss.
+    """
+    result_path = cache_dir / 'result.json'
+    cached_output = cache_dir / 'output'
+    if not result_path.exists() or not cached_output.exists():
+        return None
+
+    try:
+        cached = json.loads(result_path.read_text(encoding='utf-8'))
+        interface = Interface.from_json(cached['interface'])
+        test_plan = TestPlan.from_json(cached['test_plan'])
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(cached_output, output_path)
+    except Exception:
+        return None
+
+    return interface, test_plan
+
+
+def save_cached_build(cache_dir: Path, source_code: str, test_code: str,
+                      interface: Interface, test_plan: TestPlan,
+                      output_path: Path) -> None:
+    """Store a successful build so an identical rebuild skips the LLM."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(output_path, cache_dir / 'output')
+    (cache_dir / 'result.json').write_text(json.dumps({
+        'source_code': source_code,
+        'test_code': test_code,
+        'interface': interface.to_json(),
+        'test_plan': test_plan.to_json(),
+    }),
+                                           encoding='utf-8')
 
 
 def load_cached_artifacts(
@@ -78,37 +151,83 @@ def load_cached_artifacts(
 
     if interface_path.exists():
         try:
-            interface = Interface.from_json(
-                interface_path.read_text(encoding='utf-8'))
+            interface = Interface.from_json(interface_path.read_bytes())
         except Exception:
             pass
 
     if tests_path.exists():
         try:
-            test_plan = TestPlan.from_json(
-                tests_path.read_text(encoding='utf-8'))
+            test_plan = TestPlan.from_json(tests_path.read_bytes())
         except Exception:
             pass
 
     return interface, test_plan
 
 
+def write_if_changed(path: Path, content: bytes) -> bool:
+    """
+    Atomically replace `path` with `content` unless it already holds it.
+
+    Leaving unchanged files alone keeps their mtimes stable for make-style
+    tools. Returns True if the file was written.
+    """
+    try:
+        if path.read_bytes() == content:
+            return False
+        mode = path.stat().st_mode
+    except FileNotFoundError:
+        mode = 0o644
+
+    # Write a sibling temp file and rename it over the target, so concurrent
+    # batch compiles never observe a half-written file.
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent,
+                                    prefix=f".{path.name}.",
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    return True
+
+
+def write_files(files: Iterable[tuple[Path, str]]) -> None:
+    """Write a batch of text files; run on a worker thread by the compiler."""
+    for path, content in files:
+        path.write_text(content, encoding='utf-8')
+
+
 def save_artifacts(input_path: Path, interface: Interface,
                    test_plan: TestPlan) -> None:
     """Save generated interface and test plan."""
     interface_path = input_path.with_suffix('.interface')
     tests_path = input_path.with_suffix('.tests')
 
-    interface_path.write_text(interface.to_json(), encoding='utf-8')
-    tests_path.write_text(test_plan.to_json(), encoding='utf-8')
+    write_if_changed(interface_path, interface.to_json_bytes())
+    write_if_changed(tests_path, test_plan.to_json_bytes())
 
 
-def detect_output_type_from_spec(doc: MarkdownDocument,
-                                 session: OpenAIChatSession) -> OutputType:
-    """Use LLM to detect output type from specification."""
-    content = doc.ToMarkdown()
+OUTPUT_TYPE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {
+            "type": "string",
+            "enum": ["Executable", "Library"]
+        },
+        "reason": {
+            "type": "string"
+        }
+    },
+    "required": ["type", "reason"]
+}
 
-    prompt = f"""Analyze this specification and determine what type of output it describes.
+
+def _output_type_prompt(content: str) -> str:
+    return f"""Analyze this specification and determine what type of output it describes.
 
 Specification:
 {content}
@@ -119,28 +238,88 @@ Options:
 
 Respond with JSON: {{"type": "Executable" or "Library", "reason": "brief explanation"}}"""
 
-    result = session.chat_structured(
-        prompt, {
-            "type": "object",
-            "properties": {
-                "type": {
-                    "type": "string",
-                    "enum": ["Executable", "Library"]
-                },
-                "reason": {
-                    "type": "string"
-                }
-            },
-            "required": ["type", "reason"]
-        })
 
+def _output_type_from_result(result: dict) -> OutputType:
     return OutputType.EXECUTABLE if result[
         "type"] == "Executable" else OutputType.LIBRARY
 
 
+def detect_output_type_from_spec(doc: MarkdownDocument,
+                                 session: OpenAIChatSession) -> OutputType:
+    """Use LLM to detect output type from specification."""
+    prompt = _output_type_prompt(doc.ToMarkdown())
+    result = structured_cache.chat_structured(session, prompt,
+                                              OUTPUT_TYPE_SCHEMA)
+    return _output_type_from_result(result)
+
+
+async def detect_output_type_from_spec_async(
+        doc: MarkdownDocument, session: OpenAIChatSession) -> OutputType:
+    """Async counterpart of detect_output_type_from_spec."""
+    prompt = _output_type_prompt(doc.ToMarkdown())
+    result = await structured_cache.achat_structured(session, prompt,
+                                                     OUTPUT_TYPE_SCHEMA)
+    return _output_type_from_result(result)
+
+
+async def generate_interface_and_test_plan(
+    doc: MarkdownDocument,
+    session: OpenAIChatSession,
+    existing_interface: Optional[Interface],
+    existing_test_plan: Optional[TestPlan],
+) -> tuple[Processor, Interface, TestPlan]:
+    """
+    Detect the output type, then generate the interface and test plan.
+
+    The interface and test plan come from one LLM call, which needs the
+    output type. On a rebuild the cached interface is almost always still
+    right, so its output type is used to speculatively generate them
+    concurrently with type detection. The speculative result is only
+    thrown away (and regenerated) if the detected type disagrees with the
+    cached one.
+    """
+    if existing_interface is not None and existing_interface.output_type in (
+            OutputType.EXECUTABLE, OutputType.LIBRARY):
+        processor = get_processor(existing_interface.output_type, session)
+        output_type, (interface, test_plan) = await asyncio.gather(
+            detect_output_type_from_spec_async(doc, session),
+            processor.agenerate_interface_and_tests(doc, existing_interface,
+                                                    existing_test_plan),
+        )
+
+        if output_type == existing_interface.output_type:
+            return processor, interface, test_plan
+    else:
+        output_type = await detect_output_type_from_spec_async(doc, session)
+
+    # Output type is new or changed - nothing cached applies.
+    processor = get_processor(output_type, session)
+    interface, test_plan = await processor.agenerate_interface_and_tests(doc)
+    return processor, interface, test_plan
+
+
+REPEATED_ATTEMPT_NOTE = """
+
+You already tried this exact code; produce a materially different implementation."""
+
+
 def compile_gistpp(config: CompileConfig) -> CompileResult:
+    """Synchronous wrapper around compile_gistpp_async."""
+    return asyncio.run(compile_gistpp_async(config))
+
+
+async def compile_gistpp_async(
+    config: CompileConfig,
+    client: Optional[OpenAI] = None,
+    async_client: Optional[AsyncOpenAI] = None,
+    request_meter: Optional[RequestMeter] = None,
+) -> CompileResult:
     """
     Main compilation function.
+
+    `client`/`async_client` let batch compiles share one pair of OpenAI
+    clients (and their connection pools) across sessions, and
+    `request_meter` a requests-per-minute budget.
     
     Steps:
     1. Parse the gistpp file
@@ -164,16 +343,68 @@ def compile_gistpp(config: CompileConfig) -> CompileResult:
             error_message=f"Input file not found: {config.input_path}",
         )
 
-    doc = MarkdownDocument.FromFile(config.input_path)
-    spec_content = doc.ToMarkdown()
+    # Read once: the same bytes are hashed for the cache and parsed.
+    # Newlines are normalised as read_text() would.
+    raw = config.input_path.read_bytes()
+    spec_hash = compute_input_hash(raw)
+    spec_content = raw.decode('utf-8').replace('\r\n',
+                                               '\n').replace('\r', '\n')
+    doc = MarkdownDocument.FromString(spec_content)
 
     # Step 2: Check dependencies (skipped for bootstrap - no includes)
     # TODO: Implement dependency resolution
 
     # Create build directory
-    build_dir = config.input_path.parent / '.gistpp_build' / config.input_path.stem
+    build_root = config.input_path.parent / '.gistpp_build'
+    build_dir = build_root / config.input_path.stem
     build_dir.mkdir(parents=True, exist_ok=True)
 
+    # Identical spec, model and backend as a previous successful build?
+    backend_name = config.backend_name or infer_backend_from_output(
+        config.output_path)
+
+    # Reject a bad backend or output path before any LLM work is spent
+    try:
+        default_extension_for_backend(backend_name)
+    except ValueError as e:
+        return CompileResult(
+            success=False,
+            error_message=str(e),
+        )
+    if config.output_path.is_dir():
+        return CompileResult(
+            success=False,
+            error_message=f"Output path is a directory: {config.output_path}",
+        )
+    if not config.output_path.parent.is_dir():
+        return CompileResult(
+            success=False,
+            error_message=
+            f"Output directory not found: {config.output_path.parent}",
+        )
+
+    # Keyed on the artifact files too, so hand edits to them are rebuilt,
+    # and on a hit they already match the cached build
+    artifact_hashes = await asyncio.to_thread(compute_artifact_hashes,
+                                              config.input_path)
+    cache_dir = build_root / '.cache' / compute_cache_key(
+        spec_hash, config.model, backend_name, *artifact_hashes)
+
+    cached = await asyncio.to_thread(load_cached_build, cache_dir,
+                                     config.output_path)
+    if cached:
+        interface, test_plan = cached
+        if config.verbose:
+            print(f"Up to date (cache hit: {cache_dir.name[:16]})")
+        return CompileResult(
+            success=True,
+            output_path=config.output_path,
+            interface=interface,
+            test_plan=test_plan,
+            iterations=0,
+            warnings=warnings,
+        )
+
     # Initialize LLM session
     if config.verbose:
         print("Initializing LLM session...")
@@ -186,9 +417,12 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
         session = OpenAIChatSession(
             model=config.model,
             api_key=config.api_key,
+            config=LLMConfig(request_meter=request_meter),
             system_prompt=system_prompt,
             allowed_read_paths=[config.input_path.parent, build_dir],
             allowed_write_paths=[build_dir, config.output_path.parent],
+            client=client,
+            async_client=async_client,
         )
     except Exception as e:
         return CompileResult(
@@ -196,85 +430,56 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
             error_message=f"Failed to initialize LLM session: {e}",
         )
 
-    # Load existing artifacts
-    existing_interface, existing_test_plan = load_cached_artifacts(
-        config.input_path)
-
-    # Step 3: Detect output type and generate interface
+    # Select backend (step 5) now, so a bad one fails before steps 3-4
     if config.verbose:
-        print("Detecting output type...")
+        print(f"Using backend: {backend_name}")
 
     try:
-        output_type = detect_output_type_from_spec(doc, session)
-        if config.verbose:
-            print(f"  Detected: {output_type.value}")
-    except LLMError as e:
+        backend = get_backend(backend_name, session, build_dir)
+    except ValueError as e:
         return CompileResult(
             success=False,
-            error_message=f"Failed to detect output type: {e}",
+            error_message=str(e),
         )
 
-    # Get appropriate processor
-    processor = get_processor(output_type, session)
-
-    if config.verbose:
-        print("Generating interface...")
-
-    try:
-        interface = processor.generate_interface(doc, existing_interface)
-
-        # Check if interface changed
-        if existing_interface and existing_interface.to_json(
-        ) != interface.to_json():
-            if not config.allow_interface_changes:
-                warnings.append("Interface changed from previous build")
-
-        if config.verbose:
-            print(f"  Interface: {len(interface.schema)} items")
-    except LLMError as e:
-        return CompileResult(
-            success=False,
-            error_message=f"Failed to generate interface: {e}",
-        )
+    # Load existing artifacts
+    existing_interface, existing_test_plan = load_cached_artifacts(
+        config.input_path)
 
-    # Step 4: Generate test plan
+    # Steps 3-4: Detect output type, generate interface and test plan
     if config.verbose:
-        print("Generating test plan...")
+        print("Generating interface and test plan...")
 
     try:
-        test_plan = processor.generate_test_plan(doc, interface,
-                                                 existing_test_plan)
-
-        if config.verbose:
-            print(f"  Tests: {len(test_plan.tests)} cases")
+        processor, interface, test_plan = await generate_interface_and_test_plan(
+            doc, session, existing_interface, existing_test_plan)
     except LLMError as e:
         return CompileResult(
             success=False,
-            error_message=f"Failed to generate test plan: {e}",
+            error_message=f"Failed to generate interface and test plan: {e}",
         )
 
-    # Save artifacts
-    save_artifacts(config.input_path, interface, test_plan)
+    # Check if interface changed
+    if existing_interface and existing_interface != interface:
+        if not config.allow_interface_changes:
+            warnings.append("Interface changed from previous build")
 
-    # Step 5: Select backend
-    backend_name = config.backend_name or infer_backend_from_output(
-        config.output_path)
     if config.verbose:
-        print(f"Using backend: {backend_name}")
+        print(f"  Output type: {interface.output_type.value}")
+        print(f"  Interface: {len(interface.schema)} items")
+        print(f"  Tests: {len(test_plan.tests)} cases")
 
-    try:
-        backend = get_backend(backend_name, session, build_dir)
-    except ValueError as e:
-        return CompileResult(
-            success=False,
-            error_message=str(e),
-        )
+    # Save artifacts
+    await asyncio.to_thread(save_artifacts, config.input_path, interface,
+                            test_plan)
 
     # Step 6-7: Generate code, build, test, iterate
     if config.verbose:
         print("Starting code generation and testing loop...")
 
     previous_error = None
+    # Hashes of (source, tests) pairs that have already failed
+    failed_attempts = set()
 
     for iteration in range(1, config.max_iterations + 1):
         if config.verbose:
@@ -285,7 +490,7 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
             print("Generating code...")
 
         try:
-            source_code, test_code = backend.generate_code(
+            source_code, test_code = await backend.agenerate_code(
                 spec_content,
                 interface,
                 test_plan,
@@ -301,12 +506,24 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
                 warnings=warnings,
             )
 
+        # The LLM sometimes repeats itself verbatim; rebuilding and retesting
+        # identical code would only reproduce the same failure.
+        attempt_hash = hashlib.blake2b((source_code + test_code).encode(),
+                                       digest_size=16).hexdigest()
+        if attempt_hash in failed_attempts:
+            if config.verbose:
+                print("  Identical to a previous failed attempt, skipping build")
+            if not previous_error.endswith(REPEATED_ATTEMPT_NOTE):
+                previous_error += REPEATED_ATTEMPT_NOTE
+            continue
+        failed_attempts.add(attempt_hash)
+
         # Write source files
         source_path = build_dir / f"main{backend.file_extension}"
         test_path = build_dir / f"test_main{backend.file_extension}"
 
-        source_path.write_text(source_code, encoding='utf-8')
-        test_path.write_text(test_code, encoding='utf-8')
+        await asyncio.to_thread(write_files, ((source_path, source_code),
+                                              (test_path, test_code)))
 
         if config.verbose:
             print(f"  Source: {len(source_code)} chars")
@@ -316,7 +533,8 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
         if config.verbose:
             print("Building...")
 
-        build_result = backend.build(source_path, config.output_path)
+        build_result = await asyncio.to_thread(backend.build, source_path,
+                                               config.output_path)
 
         if not build_result.success:
             if config.verbose:
@@ -331,7 +549,9 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
         if config.verbose:
             print("Running tests...")
 
-        test_result = backend.run_tests(test_path, source_path)
+        test_result = await asyncio.to_thread(backend.run_tests, test_path,
+                                              source_path,
+                                              len(test_plan.tests))
 
         if config.verbose:
             print(
@@ -342,6 +562,19 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
             if config.verbose:
                 print("\n=== SUCCESS ===")
 
+            # Stored under the artifacts as saved above, which is how the
+            # next build will find them
+            cache_dir = build_root / '.cache' / compute_cache_key(
+                spec_hash, config.model, backend_name,
+                compute_input_hash(interface.to_json_bytes()),
+                compute_input_hash(test_plan.to_json_bytes()))
+            try:
+                await asyncio.to_thread(save_cached_build, cache_dir,
+                                        source_code, test_code, interface,
+                                        test_plan, config.output_path)
+            except OSError as e:
+                warnings.append(f"Failed to cache build: {e}")
+
             return CompileResult(
                 success=True,
                 output_path=config.output_path,
@@ -372,6 +605,35 @@ Always follow the interface definitions exactly. Generate complete, runnable cod
     )
 
 
+async def compile_batch(configs: list[CompileConfig],
+                        max_concurrency: int = 8,
+                        qpm: float = 500) -> list[CompileResult]:
+    """Compile several gistpp files concurrently, sharing OpenAI clients."""
+    client = async_client = None
+    if configs and OpenAI is not None:
+        api_key = configs[0].api_key
+        try:
+            client = OpenAI(api_key=api_key)
+            async_client = AsyncOpenAI(api_key=api_key)
+        except Exception:
+            # Let each compile report the session error itself
+            client = async_client = None
+
+    # Cap concurrent compiles, and meter their LLM requests (retries
+    # included) through one shared bucket
+    semaphore = asyncio.Semaphore(max_concurrency)
+    meter = RequestMeter(qpm)
+
+    async def run(config: CompileConfig) -> CompileResult:
+        async with semaphore:
+            return await compile_gistpp_async(config,
+                                              client=client,
+                                              async_client=async_client,
+                                              request_meter=meter)
+
+    return await asyncio.gather(*(run(c) for c in configs))
+
+
 def main():
     """CLI entry point."""
     parser = argparse.ArgumentParser(
@@ -383,15 +645,20 @@ Examples:
   gistpp hello.gistpp -o hello.py
   gistpp math.gistpp -o math.py --backend python
   gistpp app.gistpp -o app.py --max-iterations 10 --verbose
+  gistpp src/*.gistpp -o build/ --jobs 16
 """,
     )
 
-    parser.add_argument('input', type=Path, help='Input .gistpp file')
-    parser.add_argument('-o',
-                        '--output',
+    parser.add_argument('input',
                         type=Path,
-                        required=True,
-                        help='Output file path')
+                        nargs='+',
+                        help='Input .gistpp file(s)')
+    parser.add_argument(
+        '-o',
+        '--output',
+        type=Path,
+        required=True,
+        help='Output file path (output directory when given several inputs)')
     parser.add_argument(
         '-b',
         '--backend',
@@ -413,6 +680,17 @@ Examples:
         '--api-key',
         type=str,
         help='OpenAI API key (default: from OPENAI_API_KEY env)')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=8,
+        help='Max files compiled concurrently in batch mode (default: 8)')
+    parser.add_argument(
+        '--qpm',
+        type=float,
+        default=500,
+        help='Max LLM requests per minute in batch mode (default: 500)')
     parser.add_argument('-v',
                         '--verbose',
                         action='store_true',
@@ -420,35 +698,48 @@ Examples:
 
     args = parser.parse_args()
 
-    config = CompileConfig(
-        input_path=args.input.resolve(),
-        output_path=args.output.resolve(),
-        backend_name=args.backend,
-        max_iterations=args.max_iterations,
-        allow_interface_changes=args.allow_interface_changes,
-        verbose=args.verbose,
-        api_key=args.api_key,
-        model=args.model,
-    )
-
-    result = compile_gistpp(config)
+    if len(args.input) == 1:
+        outputs = [args.output.resolve()]
+    else:
+        extension = default_extension_for_backend(args.backend or 'python')
+        output_dir = args.output.resolve()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        outputs = [output_dir / f"{p.stem}{extension}" for p in args.input]
+
+    configs = [
+        CompileConfig(
+            input_path=input_path.resolve(),
+            output_path=output_path,
+            backend_name=args.backend,
+            max_iterations=args.max_iterations,
+            allow_interface_changes=args.allow_interface_changes,
+            verbose=args.verbose,
+            api_key=args.api_key,
+            model=args.model,
+        ) for input_path, output_path in zip(args.input, outputs)
+    ]
+
+    if len(configs) == 1:
+        results = [compile_gistpp(configs[0])]
+    else:
+        results = asyncio.run(compile_batch(configs, args.jobs, args.qpm))
 
     # Report results
-    if result.success:
-        print(f"✓ Successfully compiled {args.input} -> {result.output_path}")
-        print(f"  Iterations: {result.iterations}")
-        if result.warnings:
-            for w in result.warnings:
-                print(f"  ⚠ Warning: {w}")
-        sys.exit(0)
-    else:
-        print(f"✗ Failed to compile {args.input}")
-        print(f"  Error: {result.error_message}")
+    all_succeeded = True
+    for input_path, result in zip(args.input, results):
+        if result.success:
+            print(
+                f"✓ Successfully compiled {input_path} -> {result.output_path}")
+        else:
+            all_succeeded = False
+            print(f"✗ Failed to compile {input_path}")
+            print(f"  Error: {result.error_message}")
         print(f"  Iterations: {result.iterations}")
         if result.warnings:
             for w in result.warnings:
                 print(f"  ⚠ Warning: {w}")
-        sys.exit(1)
+
+    sys.exit(0 if all_succeeded else 1)
 
 
 if __name__ == '__main__':
@@ -5,15 +5,163 @@ Manages interface refinement and test generation.
 """
 from __future__ import annotations
 
+import hashlib
 import json
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
-from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
 
-from llm_session import LLMSession, Role
-from markdown_db import MarkdownDocument, NodeType
+import structured_cache
+
+# Only needed for annotations (asyncio is imported where it's used), so
+# code that just loads or saves interfaces and test plans doesn't import
+# the LLM client stack or the event loop.
+if TYPE_CHECKING:
+    from llm_session import LLMSession
+    from markdown_db import MarkdownDocument
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _dump_json(obj: Any, indent: bool = True) -> bytes:
+    """
+    Serialize an artifact as UTF-8 JSON, via orjson if available. Indented
+    for files people read, compact for embedding in prompts.
+    """
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj,
+                                option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            pass  # e.g. an integer too big for orjson; json copes
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+def _load_json(data: str | bytes) -> Any:
+    """Parse a saved artifact, via orjson if available."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. an integer too big for orjson; json copes or raises
+    return json.loads(data)
+
+
+def _interface_and_tests_schema(interface_schema: Dict[str, Any],
+                                test_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Schema for a response holding both an interface and its tests."""
+    return {
+        "type": "object",
+        "properties": {
+            "interface": interface_schema,
+            "tests": test_schema,
+        },
+        "required": ["interface", "tests"]
+    }
+
+
+# Prompt templates, filled in with str.format_map. Literal braces are doubled.
+
+OUTPUT_TYPE_PROMPT = """Analyze this gistpp specification and determine if it describes:
+1. An executable/console application
+2. A library
+3. Something else (UI, web, service, etc.)
+
+Specification:
+{content}
+
+Respond with JSON: {{"type": "Executable" or "Library" or "Other", "reason": "brief explanation"}}"""
+
+EXISTING_TESTS_CONTEXT = """
+Existing tests (contract tests MUST be preserved exactly):
+{existing}
+"""
+
+INTERFACE_AND_TESTS_PROMPT = """{interface_prompt}
+
+Then generate tests for the interface you defined.
+{existing_context}
+{test_guidance}
+
+Return a JSON object with the interface under "interface", and under "tests" an array of test cases with name, description, pseudocode, is_contract fields."""
+
+CONSOLE_EXISTING_INTERFACE_CONTEXT = """
+There is an existing interface that should be updated if needed:
+{existing}
+
+Only make changes if the specification requires them. Preserve existing behavior unless explicitly changed.
+"""
+
+CONSOLE_INTERFACE_PROMPT = """Analyze this gistpp specification and generate an interface definition for a console application.
+
+Specification:
+{content}
+{existing_context}
+Generate a JSON interface with:
+- positional_args: List of positional command line arguments
+- flags: Optional flags/switches  
+- stdin: Description of stdin input if used
+- stdout: Description of stdout output
+- stderr: Description of stderr output if used
+- exit_codes: Map of exit codes to meanings
+
+Be precise and complete. Infer reasonable defaults for anything not specified."""
+
+CONSOLE_TEST_PLAN_PROMPT = """Generate integration tests for this console application.
+
+Specification:
+{content}
+
+Interface:
+{interface}
+{existing_context}
+{test_guidance}
+
+Return as JSON array."""
+
+LIBRARY_EXISTING_INTERFACE_CONTEXT = "\nExisting interface to update:\n{existing}\n"
+
+LIBRARY_EXISTING_TESTS_CONTEXT = "\nExisting tests:\n{existing}\n"
+
+LIBRARY_INTERFACE_PROMPT = """Analyze this gistpp specification and generate an interface definition for a library.
+
+Specification:
+{content}
+{existing_context}
+Generate a JSON interface with:
+- types: Structs, classes, enums with their fields and methods
+- functions: Standalone functions with signatures
+- constants: Named constants
+- operators: Operator overloads if applicable
+
+Be complete and precise."""
+
+LIBRARY_TEST_PLAN_PROMPT = """Generate unit tests for this library.
+
+Specification:
+{content}
+
+Interface:
+{interface}
+{existing_context}
+{test_guidance}
+
+Return as JSON array with name, description, pseudocode, is_contract fields."""
+
+
+def _existing_context(template: str, existing: Any) -> str:
+    """Fill in a template for an existing Interface or TestPlan, if any."""
+    if not existing:
+        return ""
+    return template.format_map({'existing': existing.to_compact_json()})
 
 
 class OutputType(Enum):
@@ -27,7 +175,12 @@ class OutputType(Enum):
     CLOUD_SERVICE = "CloudService"
 
 
-@dataclass
+# OutputType by value. Indexing this is much cheaper than calling
+# OutputType(value), which matters when loading many saved interfaces.
+_OUTPUT_TYPE_BY_VALUE: Dict[str, OutputType] = {o.value: o for o in OutputType}
+
+
+@dataclass(slots=True)
 class TestCase:
     """A single test case."""
     name: str
@@ -36,297 +189,590 @@ class TestCase:
     is_contract: bool = False  # Contract tests can't change without user approval
 
 
-@dataclass
+@dataclass(slots=True)
 class Interface:
     """Generated interface for the output."""
     output_type: OutputType
     description: str
     schema: Dict[str, Any] = field(default_factory=dict)
+    # Interfaces aren't modified once built, so serialize only once.
+    # Prompts embed the text on every refinement, so keep that too.
+    _json: Optional[bytes] = field(default=None,
+                                   init=False,
+                                   repr=False,
+                                   compare=False)
+    _json_text: Optional[str] = field(default=None,
+                                      init=False,
+                                      repr=False,
+                                      compare=False)
+    _compact_json: Optional[str] = field(default=None,
+                                         init=False,
+                                         repr=False,
+                                         compare=False)
+    # Digest of the spec and this interface, set when generated (see
+    # Processor._spec_hash). Saved with the interface, so a re-run over an
+    # unchanged spec can reuse it without asking the LLM.
+    _spec_hash: Optional[str] = field(default=None,
+                                      init=False,
+                                      repr=False,
+                                      compare=False)
 
     def to_json(self) -> str:
-        return json.dumps(
-            {
-                "output_type": self.output_type.value,
-                "description": self.description,
-                "schema": self.schema,
-            },
-            indent=2)
+        if self._json_text is None:
+            self._json_text = self.to_json_bytes().decode('utf-8')
+        return self._json_text
+
+    def to_json_bytes(self) -> bytes:
+        if self._json is None:
+            obj = self._to_dict()
+            if self._spec_hash is not None:
+                obj["spec_hash"] = self._spec_hash
+            self._json = _dump_json(obj)
+        return self._json
+
+    def to_compact_json(self) -> str:
+        """to_json() without whitespace, to keep prompts short."""
+        if self._compact_json is None:
+            self._compact_json = _dump_json(self._to_dict(),
+                                            indent=False).decode('utf-8')
+        return self._compact_json
+
+    def _to_dict(self) -> Dict[str, Any]:
+        return {
+            "output_type": self.output_type.value,
+            "description": self.description,
+            "schema": self.schema,
+        }
 
     @classmethod
-    def from_json(cls, data: str) -> "Interface":
-        obj = json.loads(data)
-        return cls(
-            output_type=OutputType(obj["output_type"]),
+    def from_json(cls, data: str | bytes) -> "Interface":
+        obj = _load_json(data)
+        interface = cls(
+            output_type=_OUTPUT_TYPE_BY_VALUE[obj["output_type"]],
             description=obj["description"],
             schema=obj.get("schema", {}),
         )
+        interface._spec_hash = obj.get("spec_hash")
+        return interface
 
 
-@dataclass
+@dataclass(slots=True)
 class TestPlan:
     """Collection of test cases."""
     tests: List[TestCase] = field(default_factory=list)
+    # Test plans aren't modified once built, so serialize only once.
+    # Prompts embed the text on every refinement, so keep that too.
+    _json: Optional[bytes] = field(default=None,
+                                   init=False,
+                                   repr=False,
+                                   compare=False)
+    _json_text: Optional[str] = field(default=None,
+                                      init=False,
+                                      repr=False,
+                                      compare=False)
+    _compact_json: Optional[str] = field(default=None,
+                                         init=False,
+                                         repr=False,
+                                         compare=False)
 
     def to_json(self) -> str:
-        return json.dumps([{
+        if self._json_text is None:
+            self._json_text = self.to_json_bytes().decode('utf-8')
+        return self._json_text
+
+    def to_json_bytes(self) -> bytes:
+        if self._json is None:
+            self._json = _dump_json(self._to_list())
+        return self._json
+
+    def to_compact_json(self) -> str:
+        """to_json() without whitespace, to keep prompts short."""
+        if self._compact_json is None:
+            self._compact_json = _dump_json(self._to_list(),
+                                            indent=False).decode('utf-8')
+        return self._compact_json
+
+    def _to_list(self) -> List[Dict[str, Any]]:
+        return [{
             "name": t.name,
             "description": t.description,
             "pseudocode": t.pseudocode,
             "is_contract": t.is_contract,
-        } for t in self.tests],
-                          indent=2)
+        } for t in self.tests]
 
     @classmethod
-    def from_json(cls, data: str) -> "TestPlan":
-        obj = json.loads(data)
+    def from_json(cls, data: str | bytes) -> "TestPlan":
+        obj = _load_json(data)
+        # Plans can hold hundreds of tests. Passing the fields positionally,
+        # to a local name, builds them almost twice as fast as by keyword.
+        test_case = TestCase
         return cls(tests=[
-            TestCase(
-                name=t["name"],
-                description=t["description"],
-                pseudocode=t["pseudocode"],
-                is_contract=t.get("is_contract", False),
-            ) for t in obj
+            test_case(t["name"], t["description"], t["pseudocode"],
+                      t.get("is_contract", False)) for t in obj
         ])
 
 
-class Processor(ABC):
-    """Base class for type-specific processors."""
-
-    def __init__(self, session: LLMSession):
-        self.session = session
-
-    @abstractmethod
-    def detect_output_type(self, doc: MarkdownDocument) -> OutputType:
-        """Determine what type of output we're building."""
-        pass
-
-    @abstractmethod
-    def generate_interface(self,
-                           doc: MarkdownDocument,
-                           existing: Optional[Interface] = None) -> Interface:
-        """Generate or update the interface based on the gistpp document."""
-        pass
-
-    @abstractmethod
-    def generate_test_plan(self,
-                           doc: MarkdownDocument,
-                           interface: Interface,
-                           existing: Optional[TestPlan] = None) -> TestPlan:
-        """Generate or update the test plan."""
-        pass
-
+# Response schemas. Shared by every processor instance, so validators
+# compiled for them (cached by schema identity) are reused.
 
-class ConsoleApplicationProcessor(Processor):
-    """
-    Processor for console applications (executables).
-    
-    Handles:
-    - Command line argument parsing interface
-    - stdin/stdout/stderr interface
-    - Exit codes
-    - Integration tests
-    """
-
-    INTERFACE_SCHEMA = {
+TEST_SCHEMA = {
+    "type": "array",
+    "items": {
         "type": "object",
         "properties": {
-            "output_type": {
-                "type": "string",
-                "enum": ["Executable"]
+            "name": {
+                "type": "string"
             },
             "description": {
                 "type": "string"
             },
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "positional_args": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {
-                                    "type": "string"
-                                },
-                                "type": {
-                                    "type": "string"
-                                },
-                                "description": {
-                                    "type": "string"
-                                },
-                                "optional": {
-                                    "type": "boolean"
-                                },
-                            }
-                        }
-                    },
-                    "flags": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {
-                                    "type": "string"
-                                },
-                                "short": {
-                                    "type": "string"
-                                },
-                                "description": {
-                                    "type": "string"
-                                },
-                                "takes_value": {
-                                    "type": "boolean"
-                                },
-                            }
+            "pseudocode": {
+                "type": "string"
+            },
+            "is_contract": {
+                "type": "boolean"
+            },
+        },
+        "required": ["name", "description", "pseudocode", "is_contract"]
+    }
+}
+
+
+CONSOLE_INTERFACE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "output_type": {
+            "type": "string",
+            "enum": ["Executable"]
+        },
+        "description": {
+            "type": "string"
+        },
+        "schema": {
+            "type": "object",
+            "properties": {
+                "positional_args": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "name": {
+                                "type": "string"
+                            },
+                            "type": {
+                                "type": "string"
+                            },
+                            "description": {
+                                "type": "string"
+                            },
+                            "optional": {
+                                "type": "boolean"
+                            },
                         }
-                    },
-                    "stdin": {
-                        "type": "object"
-                    },
-                    "stdout": {
-                        "type": "object"
-                    },
-                    "stderr": {
-                        "type": "object"
-                    },
-                    "exit_codes": {
+                    }
+                },
+                "flags": {
+                    "type": "array",
+                    "items": {
                         "type": "object",
-                        "additionalProperties": {
-                            "type": "string"
+                        "properties": {
+                            "name": {
+                                "type": "string"
+                            },
+                            "short": {
+                                "type": "string"
+                            },
+                            "description": {
+                                "type": "string"
+                            },
+                            "takes_value": {
+                                "type": "boolean"
+                            },
                         }
-                    },
-                }
+                    }
+                },
+                "stdin": {
+                    "type": "object"
+                },
+                "stdout": {
+                    "type": "object"
+                },
+                "stderr": {
+                    "type": "object"
+                },
+                "exit_codes": {
+                    "type": "object",
+                    "additionalProperties": {
+                        "type": "string"
+                    }
+                },
             }
         }
     }
-
-    TEST_SCHEMA = {
-        "type": "array",
-        "items": {
+}
+
+
+LIBRARY_INTERFACE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "output_type": {
+            "type": "string",
+            "enum": ["Library"]
+        },
+        "description": {
+            "type": "string"
+        },
+        "schema": {
             "type": "object",
             "properties": {
-                "name": {
-                    "type": "string"
+                "types": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "type": {
+                                "type": "string",
+                                "enum": ["Struct", "Class", "Enum"]
+                            },
+                            "name": {
+                                "type": "string"
+                            },
+                            "fields": {
+                                "type": "array"
+                            },
+                            "methods": {
+                                "type": "array"
+                            },
+                        }
+                    }
                 },
-                "description": {
-                    "type": "string"
+                "functions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "name": {
+                                "type": "string"
+                            },
+                            "args": {
+                                "type": "array"
+                            },
+                            "returns": {
+                                "type": "string"
+                            },
+                            "description": {
+                                "type": "string"
+                            },
+                        }
+                    }
                 },
-                "pseudocode": {
-                    "type": "string"
+                "constants": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "name": {
+                                "type": "string"
+                            },
+                            "type": {
+                                "type": "string"
+                            },
+                            "value": {},
+                        }
+                    }
                 },
-                "is_contract": {
-                    "type": "boolean"
+                "operators": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "type": {
+                                "type": "string"
+                            },
+                            "name": {
+                                "type": "string"
+                            },
+                            "args": {
+                                "type": "array"
+                            },
+                            "returns": {
+                                "type": "string"
+                            },
+                        }
+                    }
                 },
-            },
-            "required": ["name", "description", "pseudocode"]
+            }
         }
     }
+}
 
-    def _extract_content(self, doc: MarkdownDocument) -> str:
-        """Extract the main content from the document for LLM processing."""
-        return doc.ToMarkdown()
 
-    def detect_output_type(self, doc: MarkdownDocument) -> OutputType:
-        """
-        Determine output type. For ConsoleApplicationProcessor, we verify it's an executable.
-        """
-        content = self._extract_content(doc)
-
-        prompt = f"""Analyze this gistpp specification and determine if it describes:
-1. An executable/console application
-2. A library
-3. Something else (UI, web, service, etc.)
+CONSOLE_INTERFACE_AND_TESTS_SCHEMA = _interface_and_tests_schema(
+    CONSOLE_INTERFACE_SCHEMA, TEST_SCHEMA)
 
-Specification:
-{content}
+LIBRARY_INTERFACE_AND_TESTS_SCHEMA = _interface_and_tests_schema(
+    LIBRARY_INTERFACE_SCHEMA, TEST_SCHEMA)
 
-Respond with JSON: {{"type": "Executable" or "Library" or "Other", "reason": "brief explanation"}}"""
 
-        result = self.session.chat_structured(
-            prompt, {
-                "type": "object",
-                "properties": {
-                    "type": {
-                        "type": "string",
-                        "enum": ["Executable", "Library", "Other"]
-                    },
-                    "reason": {
-                        "type": "string"
-                    }
-                },
-                "required": ["type", "reason"]
-            })
-
-        type_map = {
-            "Executable": OutputType.EXECUTABLE,
-            "Library": OutputType.LIBRARY,
-            "Other": OutputType.EXECUTABLE,  # Default fallback
-        }
-        return type_map.get(result["type"], OutputType.EXECUTABLE)
-
-    def generate_interface(self,
-                           doc: MarkdownDocument,
-                           existing: Optional[Interface] = None) -> Interface:
-        """Generate interface for a console application."""
-        content = self._extract_content(doc)
+class Processor(ABC):
+    """Base class for type-specific processors."""
 
-        existing_context = ""
-        if existing:
-            existing_context = f"""
-There is an existing interface that should be updated if needed:
-{existing.to_json()}
+    OUTPUT_TYPE: OutputType
+    INTERFACE_SCHEMA: Dict[str, Any]
+    TEST_SCHEMA: Dict[str, Any]
+    INTERFACE_AND_TESTS_SCHEMA: Dict[str, Any]
+    # What the generated tests should cover, and how each is described
+    TEST_GUIDANCE: str
 
-Only make changes if the specification requires them. Preserve existing behavior unless explicitly changed.
-"""
+    def __init__(self, session: LLMSession):
+        self.session = session
 
-        prompt = f"""Analyze this gistpp specification and generate an interface definition for a console application.
+    @abstractmethod
+    def detect_output_type(self, doc: MarkdownDocument) -> OutputType:
+        """Determine what type of output we're building."""
+        pass
 
-Specification:
-{content}
-{existing_context}
-Generate a JSON interface with:
-- positional_args: List of positional command line arguments
-- flags: Optional flags/switches  
-- stdin: Description of stdin input if used
-- stdout: Description of stdout output
-- stderr: Description of stderr output if used
-- exit_codes: Map of exit codes to meanings
+    async def adetect_output_type(self, doc: MarkdownDocument) -> OutputType:
+        """
+        Async counterpart of detect_output_type. Runs the sync version in a
+        worker thread unless overridden.
+        """
+        import asyncio  # Already loaded by whatever is awaiting this
+        return await asyncio.to_thread(self.detect_output_type, doc)
 
-Be precise and complete. Infer reasonable defaults for anything not specified."""
+    @abstractmethod
+    def _interface_prompt(self, doc: MarkdownDocument,
+                          existing: Optional[Interface]) -> str:
+        """Build the interface generation prompt."""
+        pass
 
-        result = self.session.chat_structured(prompt, self.INTERFACE_SCHEMA)
+    @abstractmethod
+    def _test_plan_prompt(self, doc: MarkdownDocument, interface: Interface,
+                          existing: Optional[TestPlan]) -> str:
+        """Build the test plan generation prompt."""
+        pass
 
-        return Interface(
-            output_type=OutputType.EXECUTABLE,
+    def _interface_and_tests_prompt(self, doc: MarkdownDocument,
+                                    existing_interface: Optional[Interface],
+                                    existing_plan: Optional[TestPlan]) -> str:
+        """The interface prompt, extended to ask for the tests as well."""
+        return INTERFACE_AND_TESTS_PROMPT.format_map({
+            'interface_prompt':
+            self._interface_prompt(doc, existing_interface),
+            'existing_context':
+            _existing_context(EXISTING_TESTS_CONTEXT, existing_plan),
+            'test_guidance':
+            self.TEST_GUIDANCE,
+        })
+
+    def _interface_from_result(self, doc: MarkdownDocument,
+                               result: Dict[str, Any]) -> Interface:
+        interface = Interface(
+            output_type=self.OUTPUT_TYPE,
             description=result.get("description", ""),
             schema=result.get("schema", {}),
         )
+        interface._spec_hash = self._spec_hash(doc, interface)
+        return interface
+
+    def _spec_hash(self, doc: MarkdownDocument, interface: Interface) -> str:
+        """Digest identifying `interface` as generated for `doc`."""
+        return hashlib.blake2b(
+            (self._extract_content(doc) + interface.to_compact_json()).encode(),
+            digest_size=16).hexdigest()
+
+    def _is_current(self, doc: MarkdownDocument,
+                    existing: Optional[Interface]) -> bool:
+        """Whether existing was generated by this processor for doc as is."""
+        return (existing is not None and existing._spec_hash is not None
+                and existing.output_type == self.OUTPUT_TYPE
+                and existing._spec_hash == self._spec_hash(doc, existing))
+
+    @staticmethod
+    def _contract_tests(existing: Optional[TestPlan]) -> Dict[str, TestCase]:
+        """Contract tests from existing, which must be preserved, by name."""
+        if not existing:
+            return {}
+        return {t.name: t for t in existing.tests if t.is_contract}
+
+    @staticmethod
+    def _test_case_from_result(t: Dict[str, Any]) -> TestCase:
+        return TestCase(t["name"], t["description"], t["pseudocode"],
+                        t.get("is_contract", False))
+
+    def _test_plan_from_result(self, result: List[Dict[str, Any]],
+                               existing: Optional[TestPlan]) -> TestPlan:
+        # Responses aren't always schema-validated (no validator library
+        # installed, or a cache hit), so is_contract may be missing.
+        contracts_by_name = self._contract_tests(existing)
+        test_case = TestCase  # See TestPlan.from_json
+        tests = list(contracts_by_name.values())
+        tests.extend(
+            test_case(t["name"], t["description"], t["pseudocode"],
+                      t.get("is_contract", False)) for t in result
+            if t["name"] not in contracts_by_name)
+
+        return TestPlan(tests=tests)
+
+    def _chat_structured(self, prompt: str, schema: Dict[str, Any]) -> Any:
+        return structured_cache.chat_structured(self.session, prompt, schema)
+
+    async def _achat_structured(self, prompt: str,
+                                schema: Dict[str, Any]) -> Any:
+        return await structured_cache.achat_structured(self.session, prompt,
+                                                       schema)
+
+    def generate_interface(self,
+                           doc: MarkdownDocument,
+                           existing: Optional[Interface] = None) -> Interface:
+        """
+        Generate or update the interface based on the gistpp document.
+        Returns existing as is if it was generated for this document.
+        """
+        if self._is_current(doc, existing):
+            return existing
+        result = self._chat_structured(
+            self._interface_prompt(doc, existing), self.INTERFACE_SCHEMA)
+        return self._interface_from_result(doc, result)
 
     def generate_test_plan(self,
                            doc: MarkdownDocument,
                            interface: Interface,
                            existing: Optional[TestPlan] = None) -> TestPlan:
-        """Generate test plan for console application."""
-        content = self._extract_content(doc)
-
-        existing_context = ""
-        contract_tests = []
-        if existing:
-            contract_tests = [t for t in existing.tests if t.is_contract]
-            existing_context = f"""
-Existing tests (contract tests MUST be preserved exactly):
-{existing.to_json()}
-"""
+        """Generate or update the test plan."""
+        result = self._chat_structured(
+            self._test_plan_prompt(doc, interface, existing), self.TEST_SCHEMA)
+        return self._test_plan_from_result(result, existing)
+
+    def stream_test_plan(
+            self,
+            doc: MarkdownDocument,
+            interface: Interface,
+            existing: Optional[TestPlan] = None) -> Iterator[TestCase]:
+        """
+        generate_test_plan, yielding each test as soon as it is received, so
+        callers can start on the first tests while the rest are generated.
 
-        prompt = f"""Generate integration tests for this console application.
+        Contract tests from existing come first. Streamed items aren't
+        validated against the schema, so any missing a name, description or
+        pseudocode are skipped.
+        """
+        contracts_by_name = self._contract_tests(existing)
+        yield from contracts_by_name.values()
+
+        stream = self.session.chat_structured_stream(
+            self._test_plan_prompt(doc, interface, existing), self.TEST_SCHEMA)
+        try:
+            for t in stream:
+                if (not isinstance(t, dict) or "name" not in t
+                        or "description" not in t or "pseudocode" not in t):
+                    continue
+                if t["name"] not in contracts_by_name:
+                    yield self._test_case_from_result(t)
+        finally:
+            stream.close()
+
+    def generate_interface_and_tests(
+        self,
+        doc: MarkdownDocument,
+        existing_interface: Optional[Interface] = None,
+        existing_plan: Optional[TestPlan] = None,
+    ) -> tuple[Interface, TestPlan]:
+        """
+        generate_interface and generate_test_plan in a single LLM call.
 
-Specification:
-{content}
+        The tests are written against the interface generated alongside
+        them, so they never need regenerating after an interface change.
 
-Interface:
-{interface.to_json()}
-{existing_context}
-Generate test cases that:
+        If existing_interface was generated for this document as is, it's
+        reused along with existing_plan, or just the tests are generated
+        if there's no plan.
+        """
+        if self._is_current(doc, existing_interface):
+            if existing_plan is not None:
+                return existing_interface, existing_plan
+            return existing_interface, self.generate_test_plan(
+                doc, existing_interface)
+        result = self._chat_structured(
+            self._interface_and_tests_prompt(doc, existing_interface,
+                                             existing_plan),
+            self.INTERFACE_AND_TESTS_SCHEMA)
+        return (self._interface_from_result(doc, result["interface"]),
+                self._test_plan_from_result(result["tests"], existing_plan))
+
+    async def agenerate_interface(
+            self,
+            doc: MarkdownDocument,
+            existing: Optional[Interface] = None) -> Interface:
+        """Async counterpart of generate_interface."""
+        if self._is_current(doc, existing):
+            return existing
+        result = await self._achat_structured(
+            self._interface_prompt(doc, existing), self.INTERFACE_SCHEMA)
+        return self._interface_from_result(doc, result)
+
+    async def agenerate_test_plan(
+            self,
+            doc: MarkdownDocument,
+            interface: Interface,
+            existing: Optional[TestPlan] = None) -> TestPlan:
+        """Async counterpart of generate_test_plan."""
+        result = await self._achat_structured(
+            self._test_plan_prompt(doc, interface, existing), self.TEST_SCHEMA)
+        return self._test_plan_from_result(result, existing)
+
+    async def agenerate_interface_and_tests(
+        self,
+        doc: MarkdownDocument,
+        existing_interface: Optional[Interface] = None,
+        existing_plan: Optional[TestPlan] = None,
+    ) -> tuple[Interface, TestPlan]:
+        """Async counterpart of generate_interface_and_tests."""
+        if self._is_current(doc, existing_interface):
+            if existing_plan is not None:
+                return existing_interface, existing_plan
+            return existing_interface, await self.agenerate_test_plan(
+                doc, existing_interface)
+        result = await self._achat_structured(
+            self._interface_and_tests_prompt(doc, existing_interface,
+                                             existing_plan),
+            self.INTERFACE_AND_TESTS_SCHEMA)
+        return (self._interface_from_result(doc, result["interface"]),
+                self._test_plan_from_result(result["tests"], existing_plan))
+
+
+# Processor class for each output type, filled in by @register_processor
+_PROCESSOR_REGISTRY: Dict[OutputType, type[Processor]] = {}
+
+
+def register_processor(output_type: OutputType):
+    """Class decorator making get_processor use a processor for output_type."""
+
+    def register(processor_class: type[Processor]) -> type[Processor]:
+        _PROCESSOR_REGISTRY[output_type] = processor_class
+        return processor_class
+
+    return register
+
+
+@register_processor(OutputType.EXECUTABLE)
+class ConsoleApplicationProcessor(Processor):
+    """
+    Processor for console applications (executables).
+    
+    Handles:
+    - Command line argument parsing interface
+    - stdin/stdout/stderr interface
+    - Exit codes
+    - Integration tests
+    """
+
+    OUTPUT_TYPE = OutputType.EXECUTABLE
+    INTERFACE_SCHEMA = CONSOLE_INTERFACE_SCHEMA
+    TEST_SCHEMA = TEST_SCHEMA
+    INTERFACE_AND_TESTS_SCHEMA = CONSOLE_INTERFACE_AND_TESTS_SCHEMA
+
+    TEST_GUIDANCE = """Generate test cases that:
 1. Cover all specified behavior from the spec
 2. Test edge cases and error handling
 3. Verify correct exit codes
@@ -336,30 +782,79 @@ Each test should have:
 - name: Short descriptive name
 - description: What is being tested
 - pseudocode: High-level test steps (will be converted to actual test code later)
-- is_contract: true if this tests core specified behavior that should never change
-
-Return as JSON array."""
+- is_contract: true if this tests core specified behavior that should never change"""
 
-        result = self.session.chat_structured(prompt, self.TEST_SCHEMA)
-
-        tests = [
-            TestCase(
-                name=t["name"],
-                description=t["description"],
-                pseudocode=t["pseudocode"],
-                is_contract=t.get("is_contract", False),
-            ) for t in result
-        ]
+    def _extract_content(self, doc: MarkdownDocument) -> str:
+        """Extract the main content from the document for LLM processing."""
+        return doc.ToMarkdown()
 
-        # Ensure contract tests from existing are preserved
-        existing_contract_names = {t.name for t in contract_tests}
-        tests = contract_tests + [
-            t for t in tests if t.name not in existing_contract_names
-        ]
+    OUTPUT_TYPE_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "type": {
+                "type": "string",
+                "enum": ["Executable", "Library", "Other"]
+            },
+            "reason": {
+                "type": "string"
+            }
+        },
+        "required": ["type", "reason"]
+    }
 
-        return TestPlan(tests=tests)
+    def _output_type_prompt(self, doc: MarkdownDocument) -> str:
+        return OUTPUT_TYPE_PROMPT.format_map(
+            {'content': self._extract_content(doc)})
 
+    @staticmethod
+    def _output_type_from_result(result: Dict[str, Any]) -> OutputType:
+        type_map = {
+            "Executable": OutputType.EXECUTABLE,
+            "Library": OutputType.LIBRARY,
+            "Other": OutputType.EXECUTABLE,  # Default fallback
+        }
+        return type_map.get(result["type"], OutputType.EXECUTABLE)
 
+    def detect_output_type(self, doc: MarkdownDocument) -> OutputType:
+        """
+        Determine output type. For ConsoleApplicationProcessor, we verify it's an executable.
+        """
+        result = self._chat_structured(self._output_type_prompt(doc),
+                                       self.OUTPUT_TYPE_SCHEMA)
+        return self._output_type_from_result(result)
+
+    async def adetect_output_type(self, doc: MarkdownDocument) -> OutputType:
+        """Async counterpart of detect_output_type."""
+        result = await self._achat_structured(self._output_type_prompt(doc),
+                                              self.OUTPUT_TYPE_SCHEMA)
+        return self._output_type_from_result(result)
+
+    def _interface_prompt(self, doc: MarkdownDocument,
+                          existing: Optional[Interface]) -> str:
+        """Interface prompt for a console application."""
+        return CONSOLE_INTERFACE_PROMPT.format_map({
+            'content':
+            self._extract_content(doc),
+            'existing_context':
+            _existing_context(CONSOLE_EXISTING_INTERFACE_CONTEXT, existing),
+        })
+
+    def _test_plan_prompt(self, doc: MarkdownDocument, interface: Interface,
+                          existing: Optional[TestPlan]) -> str:
+        """Integration test plan prompt for a console application."""
+        return CONSOLE_TEST_PLAN_PROMPT.format_map({
+            'content':
+            self._extract_content(doc),
+            'interface':
+            interface.to_compact_json(),
+            'existing_context':
+            _existing_context(EXISTING_TESTS_CONTEXT, existing),
+            'test_guidance':
+            self.TEST_GUIDANCE,
+        })
+
+
+@register_processor(OutputType.LIBRARY)
 class LibraryProcessor(Processor):
     """
     Processor for libraries.
@@ -371,195 +866,84 @@ class LibraryProcessor(Processor):
     - Unit tests
     """
 
-    INTERFACE_SCHEMA = {
-        "type": "object",
-        "properties": {
-            "output_type": {
-                "type": "string",
-                "enum": ["Library"]
-            },
-            "description": {
-                "type": "string"
-            },
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "types": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "type": {
-                                    "type": "string",
-                                    "enum": ["Struct", "Class", "Enum"]
-                                },
-                                "name": {
-                                    "type": "string"
-                                },
-                                "fields": {
-                                    "type": "array"
-                                },
-                                "methods": {
-                                    "type": "array"
-                                },
-                            }
-                        }
-                    },
-                    "functions": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {
-                                    "type": "string"
-                                },
-                                "args": {
-                                    "type": "array"
-                                },
-                                "returns": {
-                                    "type": "string"
-                                },
-                                "description": {
-                                    "type": "string"
-                                },
-                            }
-                        }
-                    },
-                    "constants": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {
-                                    "type": "string"
-                                },
-                                "type": {
-                                    "type": "string"
-                                },
-                                "value": {},
-                            }
-                        }
-                    },
-                    "operators": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "type": {
-                                    "type": "string"
-                                },
-                                "name": {
-                                    "type": "string"
-                                },
-                                "args": {
-                                    "type": "array"
-                                },
-                                "returns": {
-                                    "type": "string"
-                                },
-                            }
-                        }
-                    },
-                }
-            }
-        }
-    }
-
-    def _extract_content(self, doc: MarkdownDocument) -> str:
-        return doc.ToMarkdown()
-
-    def detect_output_type(self, doc: MarkdownDocument) -> OutputType:
-        return OutputType.LIBRARY
-
-    def generate_interface(self,
-                           doc: MarkdownDocument,
-                           existing: Optional[Interface] = None) -> Interface:
-        """Generate interface for a library."""
-        content = self._extract_content(doc)
-
-        existing_context = ""
-        if existing:
-            existing_context = f"\nExisting interface to update:\n{existing.to_json()}\n"
-
-        prompt = f"""Analyze this gistpp specification and generate an interface definition for a library.
-
-Specification:
-{content}
-{existing_context}
-Generate a JSON interface with:
-- types: Structs, classes, enums with their fields and methods
-- functions: Standalone functions with signatures
-- constants: Named constants
-- operators: Operator overloads if applicable
-
-Be complete and precise."""
-
-        result = self.session.chat_structured(prompt, self.INTERFACE_SCHEMA)
-
-        return Interface(
-            output_type=OutputType.LIBRARY,
-            description=result.get("description", ""),
-            schema=result.get("schema", {}),
-        )
-
-    def generate_test_plan(self,
-                           doc: MarkdownDocument,
-                           interface: Interface,
-                           existing: Optional[TestPlan] = None) -> TestPlan:
-        """Generate unit test plan for library."""
-        content = self._extract_content(doc)
-
-        existing_context = ""
-        contract_tests = []
-        if existing:
-            contract_tests = [t for t in existing.tests if t.is_contract]
-            existing_context = f"\nExisting tests:\n{existing.to_json()}\n"
+    OUTPUT_TYPE = OutputType.LIBRARY
+    INTERFACE_SCHEMA = LIBRARY_INTERFACE_SCHEMA
+    TEST_SCHEMA = TEST_SCHEMA
+    INTERFACE_AND_TESTS_SCHEMA = LIBRARY_INTERFACE_AND_TESTS_SCHEMA
 
-        prompt = f"""Generate unit tests for this library.
-
-Specification:
-{content}
-
-Interface:
-{interface.to_json()}
-{existing_context}
-Generate test cases covering:
+    TEST_GUIDANCE = """Generate test cases covering:
 1. All public functions and methods
 2. Edge cases (empty inputs, boundaries, etc.)
 3. Error conditions
-4. Any behavior specified in the spec
+4. Any behavior specified in the spec"""
 
-Return as JSON array with name, description, pseudocode, is_contract fields."""
-
-        result = self.session.chat_structured(
-            prompt, ConsoleApplicationProcessor.TEST_SCHEMA)
+    def _extract_content(self, doc: MarkdownDocument) -> str:
+        return doc.ToMarkdown()
 
-        tests = [
-            TestCase(
-                name=t["name"],
-                description=t["description"],
-                pseudocode=t["pseudocode"],
-                is_contract=t.get("is_contract", False),
-            ) for t in result
-        ]
+    def detect_output_type(self, doc: MarkdownDocument) -> OutputType:
+        return OutputType.LIBRARY
 
-        existing_contract_names = {t.name for t in contract_tests}
-        tests = contract_tests + [
-            t for t in tests if t.name not in existing_contract_names
-        ]
+    async def adetect_output_type(self, doc: MarkdownDocument) -> OutputType:
+        return OutputType.LIBRARY
 
-        return TestPlan(tests=tests)
+    def _interface_prompt(self, doc: MarkdownDocument,
+                          existing: Optional[Interface]) -> str:
+        """Interface prompt for a library."""
+        return LIBRARY_INTERFACE_PROMPT.format_map({
+            'content':
+            self._extract_content(doc),
+            'existing_context':
+            _existing_context(LIBRARY_EXISTING_INTERFACE_CONTEXT, existing),
+        })
+
+    def _test_plan_prompt(self, doc: MarkdownDocument, interface: Interface,
+                          existing: Optional[TestPlan]) -> str:
+        """Unit test plan prompt for a library."""
+        return LIBRARY_TEST_PLAN_PROMPT.format_map({
+            'content':
+            self._extract_content(doc),
+            'interface':
+            interface.to_compact_json(),
+            'existing_context':
+            _existing_context(LIBRARY_EXISTING_TESTS_CONTEXT, existing),
+            'test_guidance':
+            self.TEST_GUIDANCE,
+        })
 
 
 def get_processor(output_type: OutputType, session: LLMSession) -> Processor:
     """Factory to get appropriate processor for output type."""
-    processors = {
-        OutputType.EXECUTABLE: ConsoleApplicationProcessor,
-        OutputType.LIBRARY: LibraryProcessor,
-    }
-
-    processor_class = processors.get(output_type)
+    processor_class = _PROCESSOR_REGISTRY.get(output_type)
     if not processor_class:
         raise ValueError(f"No processor available for {output_type.value}")
 
     return processor_class(session)
+
+
+async def process_documents(
+    docs: Iterable[MarkdownDocument],
+    session: LLMSession,
+    max_concurrency: int = 4,
+) -> List[tuple[Processor, Interface, TestPlan]]:
+    """
+    Detect the output type of each document, then generate its interface
+    and test plan, for several documents at once.
+
+    The work is almost all waiting on the LLM, so documents are processed
+    concurrently, with at most `max_concurrency` in flight to stay within
+    rate limits. Results are in the same order as `docs`.
+    """
+    import asyncio  # Already loaded by whatever is awaiting this
+    semaphore = asyncio.Semaphore(max_concurrency)
+    detector = ConsoleApplicationProcessor(session)
+
+    async def process_one(
+            doc: MarkdownDocument) -> tuple[Processor, Interface, TestPlan]:
+        async with semaphore:
+            output_type = await detector.adetect_output_type(doc)
+            processor = get_processor(output_type, session)
+            interface, test_plan = await processor.agenerate_interface_and_tests(
+                doc)
+            return processor, interface, test_plan
+
+    return await asyncio.gather(*(process_one(doc) for doc in docs))
@@ -0,0 +1,128 @@
+# structured_cache.py
+"""
+On-disk memo of structured LLM answers, shared by every build on the machine.
+
+Answers are keyed by the model, temperature, system prompt, prompt and
+schema, so any caller asking the same question (a re-run over an unchanged
+spec, or another document with the same prompt) skips the LLM call. As with
+gistpplib's LLMCache, only deterministic (temperature 0) sessions are
+cached; anything else goes straight to the session.
+"""
+from __future__ import annotations
+
+import dbm
+import hashlib
+import json
+import shelve
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from llm_session import LLMSession
+
+STRUCTURED_CACHE_PATH = Path.home() / '.cache' / 'gistpp' / 'llm' / 'structured'
+_memo: Dict[str, Any] = {}
+_MEMO_MAX = 512
+
+# Canonical schema JSON by id(schema). Entries hold a reference to their
+# schema, so an id can't be reused while cached.
+_SCHEMA_JSON: Dict[int, tuple[Dict[str, Any], str]] = {}
+
+
+def _schema_json(schema: Dict[str, Any]) -> str:
+    entry = _SCHEMA_JSON.get(id(schema))
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+    text = json.dumps(schema, sort_keys=True)
+    if len(_SCHEMA_JSON) >= 64:
+        _SCHEMA_JSON.clear()
+    _SCHEMA_JSON[id(schema)] = (schema, text)
+    return text
+
+
+def cache_key(session: LLMSession, prompt: str, schema: Dict[str, Any]) -> str:
+    """Key for `session`'s structured answer to `prompt`."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (getattr(session, "model", ""),
+                 repr(session.config.temperature),
+                 getattr(session, "system_prompt", ""), prompt,
+                 _schema_json(schema)):
+        # NUL-separated, so adjacent parts can't run into each other
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _memo_put(key: str, value: Any) -> None:
+    if len(_memo) >= _MEMO_MAX:
+        _memo.clear()
+    _memo[key] = value
+
+
+def cached(key: str) -> Optional[Any]:
+    """Look up a structured answer, in memory first and then on disk."""
+    value = _memo.get(key)
+    if value is None:
+        try:
+            with shelve.open(str(STRUCTURED_CACHE_PATH), flag='r') as db:
+                value = db.get(key)
+        except (OSError, *dbm.error):
+            return None
+        if value is None:
+            return None
+        _memo_put(key, value)
+    return value
+
+
+def store(key: str, value: Any) -> None:
+    _memo_put(key, value)
+    try:
+        STRUCTURED_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with shelve.open(str(STRUCTURED_CACHE_PATH)) as db:
+            db[key] = value
+    except (OSError, *dbm.error):
+        pass  # The cache is only an optimisation
+
+
+def _is_valid(session: LLMSession, schema: Dict[str, Any],
+              result: Any) -> bool:
+    """Whether a cached answer still matches schema (when it can be checked)."""
+    from llm_session import BadOutputError  # Loaded with session's class
+
+    try:
+        session._check_structured(result, session._get_validator(schema))
+    except BadOutputError:
+        return False
+    return True
+
+
+def chat_structured(session: LLMSession, prompt: str,
+                    schema: Dict[str, Any]) -> Any:
+    """session.chat_structured, answered from the cache when possible."""
+    if session.config.temperature != 0:
+        return session.chat_structured(prompt, schema)
+
+    key = cache_key(session, prompt, schema)
+    result = cached(key)
+    if result is None or not _is_valid(session, schema, result):
+        result = session.chat_structured(prompt, schema)
+        store(key, result)
+    return result
+
+
+async def achat_structured(session: LLMSession, prompt: str,
+                           schema: Dict[str, Any]) -> Any:
+    """Async counterpart of chat_structured, with disk I/O off the loop."""
+    import asyncio  # Already loaded by whatever is awaiting this
+
+    if session.config.temperature != 0:
+        return await session.achat_structured(prompt, schema)
+
+    key = cache_key(session, prompt, schema)
+    result = _memo.get(key)
+    if result is None:
+        result = await asyncio.to_thread(cached, key)
+    if result is None or not _is_valid(session, schema, result):
+        result = await session.achat_structured(prompt, schema)
+        await asyncio.to_thread(store, key, result)
+    return result
@@ -1,59 +1,65 @@
-import argparse, gistpplib, os, sys
+import argparse, concurrent.futures, glob, hashlib, itertools, json, os, shutil, sys, threading
+from pathlib import Path
 
-if __name__ == "__main__":
-  parser = argparse.ArgumentParser(description="GistPP - Generate code from markdown")
-  parser.add_argument("input", type=str, help="Input markdown file")
-  parser.add_argument("output", type=str, help="Output directory")
-  parser.add_argument("-i,--interface-change",
-                      type=bool,
-                      default=False,
-                      action="store_true",
-                      help="Allow interface changes")
-  parser.add_argument("-t,--test-change",
-                      type=bool,
-                      default=False,
-                      action="store_true",
-                      help="Allow non-contract test changes")
-  parser.add_argument("-T,--contract-test-change",
-                      type=bool,
-                      default=False,
-                      action="store_true",
-                      help="Allow contract test changes")
+# Code samples drawn in parallel on a fresh build
+CODEGEN_SAMPLES = 3
+
+def _promote(sample_dir: str, output_dir: str) -> None:
+  """Move a sample build's files over output_dir, one rename per entry."""
+  for name in os.listdir(sample_dir):
+    target = os.path.join(output_dir, name)
+    if os.path.isdir(target) and not os.path.islink(target):
+      shutil.rmtree(target)
+    os.replace(os.path.join(sample_dir, name), target)
+
+
+def _serialize(artifact) -> str:
+  """Generated artifacts come back as JSON text or as parsed JSON."""
+  return artifact if isinstance(artifact, str) else json.dumps(artifact)
 
-  args = parser.parse_args()
 
-  if not os.path.exists(args.input):
+def process_spec(input_path: str, output_dir: str, flags: argparse.Namespace) -> int:
+  """Run the whole pipeline for one spec file. Returns a process exit code."""
+  if not os.path.exists(input_path):
     print("Input file does not exist")
-    exit(1)
+    return 1
 
-  if not args.input.endswith(".gistpp"):
+  if not input_path.endswith(".gistpp"):
     print("Input file must be a gistpp file")
-    exit(1)
+    return 1
 
-  f = open(args.input, "r")
-  spec_content = f.read()
-  f.close()
+  # Imported only once there's real work: it pulls in pymarkdown and the OpenAI SDK
+  import gistpplib
 
-  if not gistpplib.validate(spec_content, "gistpp"):
-    print("Exiting due to invalid spec file: " + args.input)
-    exit(1)
+  spec_content = Path(input_path).read_text()
 
-  interfaceFile = args.input.replace(".gistpp", ".interface")
-  testsFile = args.input.replace(".gistpp", ".tests")
+  # Parse once; validation and the parser share the document
+  try:
+    spec_db = gistpplib.parse_markdown(spec_content)
+  except ValueError as e:
+    print("Exiting due to invalid spec file: " + input_path)
+    return 1
+
+  if not gistpplib.validate(spec_content, "gistpp", parsed=spec_db):
+    print("Exiting due to invalid spec file: " + input_path)
+    return 1
+
+  interfaceFile = input_path.replace(".gistpp", ".interface")
+  testsFile = input_path.replace(".gistpp", ".tests")
+  incremental = os.path.exists(interfaceFile)
 
   try:
-    spec_db = gistpplib.MarkdownDocument(spec_content)
     parsed = gistpplib.GistPPParser(spec_db)
   except ValueError as e:
-    print("Exiting due to invalid spec file: " + args.input)
-    exit(1)
+    print("Exiting due to invalid spec file: " + input_path)
+    return 1
 
   llmSession = None
 
   def lazy_llm_session():
-    global llmSession
+    nonlocal llmSession
     if llmSession is None:
-      llmSession = gistpplib.llm_factory.LlmFactory()
+      llmSession = gistpplib.llm_factory.LlmFactory(output_dir)
     return llmSession
 
   ##### Interface Generation #####
@@ -61,23 +67,28 @@ if __name__ == "__main__":
   if not os.path.exists(interfaceFile):
     print("First run - generating interface...")
     interface = gistpplib.generate_interface(parsed, spec_content, "", lazy_llm_session())
-    f = open(interfaceFile, "w")
-    f.write(interface)
-    f.close()
-  elif args.interface_change:
+    interface_content = _serialize(interface)
+    Path(interfaceFile).write_text(interface_content)
+  elif flags.interface_change:
     print("Interface change allowed. Checking for changes...")
-    interface_content = open(interfaceFile, "r").read()
+    previous_interface = Path(interfaceFile).read_text()
 
-    interface = gistpplib.generate_interface(parsed, spec_content, interface_content,
+    interface = gistpplib.generate_interface(parsed, spec_content, previous_interface,
                                              lazy_llm_session())
-    f = open(interfaceFile, "w")
-    f.write(interface)
-    f.close()
+    interface_content = _serialize(interface)
+    # We already hold the old contents, so an unchanged file costs nothing to skip
+    if interface_content != previous_interface:
+      Path(interfaceFile).write_text(interface_content)
+  else:
+    interface_content = Path(interfaceFile).read_text()
 
-  interface_content = open(interfaceFile, "r").read()
   if not gistpplib.validate(interface_content, "interface"):
     print("Exiting due to invalid interface")
-    exit(1)
+    return 1
+
+  # The file wraps the interface with the spec hash it was generated from; prompts only want the
+  # interface itself
+  interface_content = gistpplib.Interface._existing_interface(interface_content)
 
   ##### Test Generation #####
   print("Generating tests...")
@@ -86,25 +97,31 @@ if __name__ == "__main__":
 
   if not os.path.exists(testsFile):
     print("First run - generating tests")
-    tests = gistpplib.generate_tests(parsed, spec_content, "[]", True, interface_content,
+    tests = gistpplib.generate_tests(parsed,
+                                     spec_content,
+                                     "[]",
+                                     True,
+                                     interface_content,
                                      lazy_llm_session())
     if tests is None:
-      exit(1)
-    f = open(testsFile, "w")
-    f.write(tests)
-    f.close()
+      return 1
+    tests = _serialize(tests)
+    Path(testsFile).write_text(tests)
     testsWritten = True
-  elif args.test_change or args.contract_test_change:
+  elif flags.test_change or flags.contract_test_change:
     print("Test changes allowed.")
-    tests = open(testsFile, "r").read()
-    tests = gistpplib.generate_tests(parsed, spec_content, tests,
-                                     (args.test_change, args.contract_test_change),
-                                     interface_content, lazy_llm_session())
+    previous_tests = Path(testsFile).read_text()
+    tests = gistpplib.generate_tests(parsed,
+                                     spec_content,
+                                     previous_tests,
+                                     (flags.test_change, flags.contract_test_change),
+                                     interface_content,
+                                     lazy_llm_session())
     if tests is None:
-      exit(1)
-    f = open(testsFile, "w")
-    f.write(tests)
-    f.close()
+      return 1
+    tests = _serialize(tests)
+    if tests != previous_tests:
+      Path(testsFile).write_text(tests)
     testsWritten = True
 
   ### Dependancy Resolution ###
@@ -116,38 +133,108 @@ if __name__ == "__main__":
   ### Code Generation ###
   print("Generating code...")
 
-  codeGen = gistpplib.CodeGeneratorFactory(parsed.output_type, spec_content, spec_db,
-                                           interface_content, testsFile, parsed.dependencies,
-                                           args.build_dir)
-  codeGen.generateCode(incremental=bool(existing))
-
-  if testsWritten:
-    codeGen.generateTests()
+  def make_code_generator(build_dir):
+    return gistpplib.CodeGeneratorFactory(parsed.output_type, spec_content, spec_db,
+                                          interface_content, testsFile, parsed.dependencies,
+                                          build_dir)
+
+  def make_compiler(build_dir):
+    return gistpplib.CompilerFactory(parsed.output_type, spec_content, spec_db, build_dir)
+
+  def generate_and_compile(build_dir, stop=None):
+    os.makedirs(build_dir, exist_ok=True)
+    codeGen = make_code_generator(build_dir)
+    codeGen.generateCode(incremental=incremental)
+
+    if testsWritten:
+      codeGen.generateTests()
+
+    # Another sample has already compiled, so don't spend a compile on this one
+    if stop is not None and stop.is_set():
+      return None
+
+    compiler = make_compiler(build_dir)
+    return (codeGen, compiler) + tuple(compiler.compile())
+
+  if incremental:
+    # Incremental builds edit the existing code, so there's only one
+    codeGen, compiler, success, message = generate_and_compile(output_dir)
+  else:
+    # A fresh build draws several samples at once, each in its own scratch directory, and
+    # keeps whichever compiles first (or, failing that, any that produced code).
+    # Named after the spec, as specs in a batch share output_dir.
+    sampleName = Path(input_path).stem
+    sampleDirs = [
+      os.path.join(output_dir, f".sample-{sampleName}-{i}") for i in range(CODEGEN_SAMPLES)
+    ]
+    stop = threading.Event()
+    results = {}
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=len(sampleDirs))
+    try:
+      futures = {pool.submit(generate_and_compile, d, stop): d for d in sampleDirs}
+      for future in concurrent.futures.as_completed(futures):
+        try:
+          result = future.result()
+        except Exception as e:
+          print(f"Code sample failed: {e}")
+          continue
+        if result is not None:
+          results[futures[future]] = result
+          if result[2]:
+            break
+    finally:
+      # Losers that are already running finish their current step, then stop before
+      # compiling; nothing is written into output_dir until they're done.
+      stop.set()
+      pool.shutdown(wait=True, cancel_futures=True)
+
+    try:
+      if not results:
+        print("Code generation failed for every sample")
+        return 1
+
+      winner = next((d for d, r in results.items() if r[2]), next(iter(results)))
+      _promote(winner, output_dir)
+    finally:
+      for d in sampleDirs:
+        shutil.rmtree(d, ignore_errors=True)
+
+    # Carry on in output_dir, so feedback and the user's output refer to the promoted code.
+    # The code on disk is the state the generator works from from here on.
+    codeGen = make_code_generator(output_dir)
+    compiler = make_compiler(output_dir)
+    success, message = results[winner][2:]
+    if not success:
+      success, message = compiler.compile()
 
   ### Compilation ###
   print("Compiling code...")
 
-  compiler = gistpplib.CompilerFactory(parsed.output_type, spec_content, spec_db, args.build_dir)
-
-  compileCount = 10
-  while compileCount > 0:
-    compileCount -= 1
-    success, message = compiler.compile()
-    if success:
-      break
+  # Feeding back an error we've already fed back would just get the same fix again
+  previousMessages = set()
 
+  compileCount = 10 - 1  # The first attempt was made above
+  while not success:
     if compileCount == 0:
       print("Compilation failed: Generated code isn't compiling after 10 attempts")
       print(message)
-      exit(1)
+      return 1
+
+    if _seen_before(message, previousMessages):
+      print("Compilation failed: Code generation is stuck on the same error")
+      print(message)
+      return 1
 
     codeGen.feedback(message, "Compile")
+    compileCount -= 1
+    success, message = compiler.compile()
 
   ### Test Running ###
   print("Running tests...")
 
   testHarness = gistpplib.TestHarnessFactory(parsed.output_type, spec_content, spec_db,
-                                             parsed.tests, args.build_dir)
+                                             parsed.tests, output_dir)
 
   testCount = 10
   while testCount > 0:
@@ -159,8 +246,80 @@ if __name__ == "__main__":
     if testCount == 0:
       print("Tests failed: Generated code isn't passing tests after 10 attempts")
       print(message)
-      exit(1)
+      return 1
+
+    if _seen_before(message, previousMessages):
+      print("Tests failed: Code generation is stuck on the same failures")
+      print(message)
+      return 1
 
     codeGen.feedback(message, "Tests")
 
   print("Success")
+  return 0
+
+
+def _seen_before(message: str, seen: set) -> bool:
+  """Record a failure message, returning True if it has already been seen."""
+  h = hashlib.sha256(message.encode()).hexdigest()
+  if h in seen:
+    return True
+  seen.add(h)
+  return False
+
+
+def find_specs(input: str) -> list:
+  """Expand an input argument (file, directory or glob) into spec paths."""
+  if os.path.isdir(input):
+    return sorted(glob.glob(os.path.join(input, "*.gistpp")))
+  return sorted(glob.glob(input)) or [input]
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="GistPP - Generate code from markdown")
+  parser.add_argument("input", type=str, help="Input gistpp file, directory of them, or glob")
+  parser.add_argument("output", type=str, help="Output directory")
+  parser.add_argument("-i",
+                      "--interface-change",
+                      default=False,
+                      action="store_true",
+                      help="Allow interface changes")
+  parser.add_argument("-t",
+                      "--test-change",
+                      default=False,
+                      action="store_true",
+                      help="Allow non-contract test changes")
+  parser.add_argument("-T",
+                      "--contract-test-change",
+                      default=False,
+                      action="store_true",
+                      help="Allow contract test changes")
+  parser.add_argument("--threads",
+                      default=False,
+                      action="store_true",
+                      help="Process multiple specs on threads sharing one LLM connection pool, "
+                      "rather than in separate processes")
+
+  args = parser.parse_args()
+
+  specs = find_specs(args.input)
+  if len(specs) == 1:
+    sys.exit(process_spec(specs[0], args.output, args))
+
+  # Specs are independent and mostly wait on the LLM, so run them side by side. Threads share
+  # the factory's OpenAI client and so its connection pool.
+  if args.threads:
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+  else:
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+
+  # Each spec builds (and promotes its samples) in its own output directory, so parallel specs
+  # can't overwrite each other's builds
+  output_dirs = [os.path.join(args.output, Path(spec).stem) for spec in specs]
+
+  with executor:
+    results = list(executor.map(process_spec, specs, output_dirs, itertools.repeat(args)))
+
+  for spec, result in zip(specs, results):
+    print(("OK     " if result == 0 else "FAILED ") + spec)
+  sys.exit(max(results))
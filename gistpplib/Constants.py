@@ -1,3 +1,5 @@
+import json as _json
+
 target_types = [
   "Library", "Executable", "App", "WebFrontEnd", "Experience", "BackgroundTask", "CloudService"
 ]
@@ -225,3 +227,9 @@ TEST_SCHEMA = {
     "required": ["name", "description", "pseudocode", "type"]
   }
 }
+
+# Canonical serializations of the schemas above, for cache keys. Built once at
+# import rather than on every lookup.
+EXECUTABLE_INTERFACE_SCHEMA_JSON = _json.dumps(EXECUTABLE_INTERFACE_SCHEMA, sort_keys=True)
+LIBRARY_INTERFACE_SCHEMA_JSON = _json.dumps(LIBRARY_INTERFACE_SCHEMA, sort_keys=True)
+TEST_SCHEMA_JSON = _json.dumps(TEST_SCHEMA, sort_keys=True)
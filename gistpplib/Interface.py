@@ -1,11 +1,53 @@
+import hashlib
+import json
+
 from .markdown_db import MarkdownDocument
 from .Parser import GistPPParser
 from .llm_session import LLMSession
 from .Constants import *
 
 
+def _package_interface(interface: dict, hashCode: str) -> dict:
+    return {"hashCode": hashCode, "interface": interface}
+
+
+def _should_regenerate(existing: str, hashCode: str) -> bool:
+    """False if `existing` was generated from a spec with this hash."""
+    try:
+        return json.loads(existing).get("hashCode") != hashCode
+    except (ValueError, AttributeError):
+        return True
+
+
+def _existing_interface(existing: str) -> str:
+    """The bare interface JSON from a persisted interface file."""
+    try:
+        stored = json.loads(existing)
+    except ValueError:
+        return existing
+    if isinstance(stored, dict) and "interface" in stored:
+        return json.dumps(stored["interface"], indent=2)
+    return existing
+
+
+def _interface_request(existing: str) -> str:
+    if existing == "":
+        return "Generate an interface definition for it."
+    return "Improve this existing interface defintion:\n\n" + existing + \
+        "\n\nIf the interface doesn't need to be changed, respond with the same interface."
+
+
 def generate_interface(parsed: GistPPParser, raw: str, existing: str,
                        llm: LLMSession) -> dict:
+    hashCode = hashlib.sha256(raw.encode()).hexdigest()
+
+    # Same spec as last time: the interface can't need changing
+    if not _should_regenerate(existing, hashCode):
+        return json.loads(existing)
+
+    if existing:
+        existing = _existing_interface(existing)
+
     if parsed.target_type == "Executable":
         prompt = f"""
 
@@ -25,16 +67,15 @@ Generate an interface (and serialize it as JSON) with:
 
 Be precise and complete. Infer reasonable defaults for anything not specified."""
 
-        if existing == "":
-            prompt = "Analyze this specification and generate an interface definition for a console application." + prompt
-        else:
-            prompt = "Analyze this specification and improve this interface defintion:\n\n" \
-                 + existing + "\n\n" + prompt + \
-                    "\nIf the interface doesn't need to be changed, respond with the same interface."
+        # The spec and instructions lead so they form a stable, cacheable
+        # prefix; the draft/improve request follows as a separate message.
+        prompt = "Analyze this specification for a console application." + prompt
+        request = _interface_request(existing)
 
-        result = llm.chat_structured(prompt, EXECUTABLE_INTERFACE_SCHEMA)
+        result = llm.chat_structured(prompt, EXECUTABLE_INTERFACE_SCHEMA,
+                                     request)
 
-        return result
+        return _package_interface(result, hashCode)
 
     if parsed.target_type == "Library":
 
@@ -54,15 +95,11 @@ Generate an interface (and serialize it as JSON) with:
 
 Be complete and precise."""
 
-        if existing == "":
-            prompt = "Analyze this specification and generate an interface definition for a library." + prompt
-        else:
-            prompt = "Analyze this specification and improve this interface defintion:\n\n" \
-                 + existing + "\n\n" + prompt + \
-                    "\nIf the interface doesn't need to be changed, respond with the same interface."
+        prompt = "Analyze this specification for a library." + prompt
+        request = _interface_request(existing)
 
-        result = llm.chat_structured(prompt, LIBRARY_INTERFACE_SCHEMA)
+        result = llm.chat_structured(prompt, LIBRARY_INTERFACE_SCHEMA, request)
 
-        return result
+        return _package_interface(result, hashCode)
 
     assert False
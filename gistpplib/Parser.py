@@ -1,7 +1,19 @@
+import re
+import types
+
 from gistpplib.markdown_db import MarkdownDocument, NodeType
 
 from .Constants import *
 
+# Case-insensitive substring match for each target type. Alternatives are tried
+# in list order from the start of the title, so earlier types win as before.
+_TARGET_RE = re.compile(
+    "|".join(f".*?(?P<{tt}>{re.escape(tt)})" for tt in target_types),
+    re.IGNORECASE | re.DOTALL)
+
+# Stands in for an optional section that's absent
+_EMPTY = types.SimpleNamespace(Children=())
+
 
 class GistPPParser:
 
@@ -10,10 +22,9 @@ class GistPPParser:
 
         title = spec_content.Children[0].Text
 
-        for tt in target_types:
-            if tt.lower() in title.lower():
-                self.target_type = tt
-                break
+        m = _TARGET_RE.match(title)
+        if m:
+            self.target_type = m.lastgroup
         else:
             print("Unknown target type? Title should contain one of " +
                   ", ".join(target_types))
@@ -21,18 +32,18 @@ class GistPPParser:
 
         subHeadings = {}
 
-        self.intro = ""
+        _intro_parts = []
 
         for c in spec_content.Children[0].Children:
             if c.Type == NodeType.Paragraph:
-                self.intro += c.Text
+                _intro_parts.append(c.Text)
             else:
                 subHeadings[c.Text] = c
 
+        self.intro = "".join(_intro_parts)
+
         self.behavior = subHeadings["Behavior"].Children
 
-        self.dependencies = subHeadings[
-            "Dependencies"].Children if "Dependencies" in subHeadings else []
+        self.dependencies = subHeadings.get("Dependencies", _EMPTY).Children
 
-        self.tests = subHeadings[
-            "Tests"].Children if "Tests" in subHeadings else []
+        self.tests = subHeadings.get("Tests", _EMPTY).Children
@@ -1,11 +1,40 @@
+import functools
+from typing import Optional
+
 from .markdown_db import *
-from pymarkdown.api import PyMarkdownApi, PyMarkdownApiException
 
 
-def validate(spec_content: str, file_type: str) -> bool:
+# pymarkdown is slow to import, so it's only loaded once something is validated.
+# The API object holds only configuration, so one instance serves every scan.
+@functools.lru_cache(maxsize=None)
+def _pymarkdown_api():
+    from pymarkdown.api import PyMarkdownApi
+    return PyMarkdownApi()
+
+
+@functools.lru_cache(maxsize=8)
+def parse_markdown(content: str) -> MarkdownDocument:
+    """
+    Parse markdown, reusing the document if the same text was parsed recently.
+
+    The returned document is shared between callers: don't modify it.
+    """
+    return MarkdownDocument(content)
+
+
+def validate(spec_content: str,
+             file_type: str,
+             *,
+             parsed: Optional[MarkdownDocument] = None) -> bool:
+    """
+    Lint `spec_content` and check its layout for `file_type`.
+
+    Pass the already-parsed document as `parsed` to avoid parsing it again.
+    """
+    from pymarkdown.api import PyMarkdownApiException
+
     try:
-        api = PyMarkdownApi()
-        result = api.scan_string(spec_content)
+        result = _pymarkdown_api().scan_string(spec_content)
     except PyMarkdownApiException as e:
         print(e)
         return False
@@ -33,7 +62,8 @@ Column: {sf.column_number}
         return False
 
     if file_type == "gistpp":
-        spec_db = MarkdownDocument(spec_content)
+        spec_db = parsed if parsed is not None else parse_markdown(
+            spec_content)
 
         assert len(spec_db.Children) == 1, "mardownlint should guarentee this"
         assert spec_db.Children[
@@ -1,7 +1,32 @@
-from .Validator import validate
+import importlib
+
 from .markdown_db import *
-from .Interface import generate_interface
-from .Tests import generate_tests, test_types
 from .Constants import *
-from .Parser import GistPPParser
-from .llm_factory import LlmFactory
+
+# Everything else is imported on first use (PEP 562), so e.g. `gistpp --help`
+# doesn't pay for loading pymarkdown and the OpenAI SDK.
+_LAZY = {
+    "validate": ".Validator",
+    "parse_markdown": ".Validator",
+    "generate_interface": ".Interface",
+    "generate_tests": ".Tests",
+    "test_types": ".Tests",
+    "GistPPParser": ".Parser",
+    "LlmFactory": ".llm_factory",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    else:
+        # Submodules, e.g. gistpplib.llm_factory
+        try:
+            value = importlib.import_module("." + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(
+                f"module {__name__!r} has no attribute {name!r}") from None
+    globals()[name] = value
+    return value
@@ -0,0 +1,165 @@
+# llm_cache.py
+"""
+On-disk cache of structured LLM responses.
+
+Wraps an LLMSession so repeated runs over an unchanged spec reuse earlier
+answers instead of paying for another round trip.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from .Constants import (
+    EXECUTABLE_INTERFACE_SCHEMA,
+    EXECUTABLE_INTERFACE_SCHEMA_JSON,
+    LIBRARY_INTERFACE_SCHEMA,
+    LIBRARY_INTERFACE_SCHEMA_JSON,
+    TEST_SCHEMA,
+    TEST_SCHEMA_JSON,
+)
+from .llm_session import LLMSession, Role
+
+# The schemas in Constants are module-level and never modified, so their
+# serializations can be looked up by identity.
+_SCHEMA_JSON = {
+    id(EXECUTABLE_INTERFACE_SCHEMA): EXECUTABLE_INTERFACE_SCHEMA_JSON,
+    id(LIBRARY_INTERFACE_SCHEMA): LIBRARY_INTERFACE_SCHEMA_JSON,
+    id(TEST_SCHEMA): TEST_SCHEMA_JSON,
+}
+
+
+def _schema_json(schema: Dict[str, Any]) -> str:
+    schema_json = _SCHEMA_JSON.get(id(schema))
+    if schema_json is None:
+        schema_json = json.dumps(schema, sort_keys=True)
+    return schema_json
+
+
+class LLMCache:
+    """
+    Content-addressed cache in front of an LLMSession.
+
+    chat_structured results are stored under
+    `{build_dir}/.llm-cache/{key[:2]}/{key}.json`, keyed by the model, the
+    conversation so far (system prompt included), the prompt and the schema.
+    Only deterministic (temperature 0) sessions are cached. Everything else
+    is passed straight through to the session.
+    """
+
+    def __init__(self, session: LLMSession, build_dir: str | os.PathLike):
+        self.session = session
+        self.cache_dir = Path(build_dir) / ".llm-cache"
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    def _key(self, prompt: str, schema: Dict[str, Any],
+             ephemeral_suffix: str) -> str:
+        # The same prompt can mean different things in different
+        # conversations (e.g. a retry that only sends the validation
+        # errors), so the whole history the call is sent with is keyed.
+        h = hashlib.sha256()
+        h.update(getattr(self.session, "model", "").encode())
+        for message in self.session.build_messages():
+            h.update(b"\0")
+            h.update(
+                json.dumps(message.to_api_dict(), sort_keys=True).encode())
+        for part in (prompt, ephemeral_suffix, _schema_json(schema)):
+            h.update(b"\0")
+            h.update(part.encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, result: Any) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        except OSError:
+            return  # Caching is best effort
+
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            Path(tmp_path).unlink(missing_ok=True)
+
+    def chat_structured(self,
+                        user_message: str,
+                        schema: Dict[str, Any],
+                        ephemeral_suffix: str = "") -> Dict[str, Any]:
+        """chat_structured, answered from the cache when possible."""
+        if self.session.config.temperature != 0:
+            return self.session.chat_structured(user_message, schema,
+                                                ephemeral_suffix)
+
+        key = self._key(user_message, schema, ephemeral_suffix)
+        result = self._load(key)
+        if result is None:
+            result = self.session.chat_structured(user_message, schema,
+                                                  ephemeral_suffix)
+            self._store(key, result)
+        else:
+            # Keep the conversation as if the call had been made
+            self.session.add_message(Role.USER, user_message)
+            if ephemeral_suffix:
+                self.session.add_message(Role.USER, ephemeral_suffix)
+            self.session.add_message(Role.ASSISTANT, result)
+
+        return result
+
+    def chat_structured_stream(self,
+                               user_message: str,
+                               schema: Dict[str, Any],
+                               ephemeral_suffix: str = "") -> Iterator[Any]:
+        """
+        chat_structured_stream, replayed from the cache when possible.
+
+        Only responses that were streamed to the end are stored, along with
+        the raw response text, so a replay leaves the same history behind as
+        the live call did (and later keys still match).
+        """
+        if self.session.config.temperature != 0:
+            yield from self.session.chat_structured_stream(
+                user_message, schema, ephemeral_suffix)
+            return
+
+        key = self._key(user_message, schema, ephemeral_suffix) + ".items"
+        cached = self._load(key)
+        if isinstance(cached, dict):
+            self.session.add_message(Role.USER, user_message)
+            if ephemeral_suffix:
+                self.session.add_message(Role.USER, ephemeral_suffix)
+            self.session.add_message(Role.ASSISTANT, cached["text"])
+            yield from cached["items"]
+            return
+
+        items = []
+        stream = self.session.chat_structured_stream(user_message, schema,
+                                                     ephemeral_suffix)
+        try:
+            for item in stream:
+                items.append(item)
+                yield item
+        finally:
+            stream.close()
+        # The session has just recorded the raw text as the assistant turn
+        self._store(key, {
+            "text": self.session.messages[-1].content,
+            "items": items
+        })
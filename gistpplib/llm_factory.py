@@ -1,19 +1,60 @@
-from .openai_session import OpenAIChatSession
+import threading
+from typing import Optional
+
+from .llm_cache import LLMCache
+from .llm_session import LLMConfig
+from .openai_session import OPENAI_AVAILABLE, OpenAI, OpenAIChatSession
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
 
 system_prompt = """
 You are a senior software engineer, helping to plan software engineering tasks at a high level.
 """
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def _shared_client():
+    """
+    One OpenAI client per process, on a keep-alive (and HTTP/2 where the h2
+    package is installed) httpx client, so every session reuses connections
+    instead of paying a new TLS handshake.
+    """
+    global _client
+    with _client_lock:
+        if _client is None and OPENAI_AVAILABLE and HTTPX_AVAILABLE:
+            limits = httpx.Limits(max_keepalive_connections=20)
+            try:
+                http_client = httpx.Client(http2=True, limits=limits)
+            except ImportError:
+                http_client = httpx.Client(limits=limits)
+            _client = OpenAI(http_client=http_client)
+    return _client
+
+
+def LlmFactory(build_dir: Optional[str] = None, client=None):
+    """
+    Create the LLM session used for planning.
 
-def LlmFactory():
+    With a build_dir, the session runs at temperature 0 and its structured
+    responses are cached under build_dir (see LLMCache). Sessions share one
+    OpenAI client unless `client` is given.
+    """
     exceptions = []
     try:
         session = OpenAIChatSession(
             model="gpt-5.2-pro-2025-12-11",
+            config=LLMConfig(temperature=0.0) if build_dir else None,
             system_prompt=system_prompt,
+            client=client or _shared_client(),
         )
-        return session
-    except e:
+        return LLMCache(session, build_dir) if build_dir else session
+    except Exception as e:
         exceptions.append(e)
 
     raise Exception("Failed to create LLM session\n\n" +
@@ -5,54 +5,173 @@ Provides conversation memory, tool calling, and structured output.
 """
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+import random
+import threading
 import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
 from enum import Enum
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import (Any, Callable, Deque, Dict, Iterator, List, Optional,
+                    Sequence, Tuple, Union)
+
+try:
+    import jsonschema
+    JSONSCHEMA_AVAILABLE = True
+except ImportError:
+    JSONSCHEMA_AVAILABLE = False
+
+try:
+    import fastjsonschema
+    FASTJSONSCHEMA_AVAILABLE = True
+except ImportError:
+    FASTJSONSCHEMA_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _dumps_json(obj: Any) -> str:
+    """Compact JSON text for obj, via orjson if available."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            pass  # e.g. an integer too big for orjson; json copes
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
 
 
-class Role(Enum):
+class Role(str, Enum):
     SYSTEM = "system"
     USER = "user"
     ASSISTANT = "assistant"
     TOOL = "tool"
 
 
-@dataclass
+MessageContent = Union[str, Dict[str, Any], List[Any]]
+
+
+@dataclass(slots=True)
 class Message:
     role: Role
-    content: str
+    # Structured responses are kept as parsed JSON, and only serialized
+    # (once, see to_api_dict) when they need to be sent
+    content: MessageContent
     tool_calls: Optional[List[Dict[str, Any]]] = None
     tool_call_id: Optional[str] = None
     name: Optional[str] = None  # For tool responses
+    _api_dict: Optional[Dict[str, Any]] = field(default=None,
+                                                init=False,
+                                                repr=False,
+                                                compare=False)
+
+    def to_api_dict(self) -> Dict[str, Any]:
+        """
+        The message in chat-completions wire format.
+
+        Built on first use and cached, since the whole history is sent on
+        every call. Messages are treated as immutable once created; the
+        returned dict mustn't be modified.
+        """
+        if self._api_dict is None:
+            content = self.content
+            if not isinstance(content, str):
+                content = _dumps_json(content)
+            result: Dict[str, Any] = {
+                "role": self.role,
+                "content": content or "",
+            }
 
+            if self.tool_calls:
+                result["tool_calls"] = self.tool_calls
 
-@dataclass
+            if self.role == Role.TOOL:
+                result["tool_call_id"] = self.tool_call_id
+                if self.name:
+                    result["name"] = self.name
+
+            self._api_dict = result
+        return self._api_dict
+
+
+@dataclass(slots=True)
 class ToolDefinition:
     """Definition of a tool the LLM can call."""
     name: str
     description: str
     parameters: Dict[str, Any]  # JSON Schema format
     handler: Callable[..., str]
+    # Whether calls may run concurrently with other calls from the same
+    # response. Only if every call in a response is, are they parallelized.
+    parallel: bool = False
+    # Compiled from parameters by register_tool (None without a validator
+    # library)
+    validator: Optional[Any] = field(default=None, repr=False, compare=False)
 
 
-@dataclass
+class RequestMeter:
+    """
+    Leaky bucket spacing API requests `60 / per_minute` seconds apart.
+
+    One meter can be shared by many sessions, sync or async, to keep them
+    under a common requests-per-minute budget.
+    """
+
+    def __init__(self, per_minute: float):
+        self._interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Claim the next slot, returning how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self._interval
+        return start - now
+
+    def wait(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def await_turn(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass(slots=True)
 class LLMConfig:
     """Configuration for LLM session."""
     max_tokens: int = 4096
     temperature: float = 0.2
     max_retries: int = 3
     retry_base_delay: float = 1.0  # Exponential backoff base
+    retry_max_delay: float = 30.0
+    retry_jitter: float = 0.5  # Delays vary by up to this fraction either way
     max_tool_calls: int = 50
+    max_tool_args_chars: int = 1_000_000  # Longer arguments aren't parsed
     max_bytes_read: int = 100_000
     max_bytes_written: int = 100_000
     timeout_seconds: float = 120.0
+    # Compact history before a call once it's estimated to exceed this
+    compact_threshold_tokens: int = 100_000
+    # Paces every API request, retries included (None: unmetered)
+    request_meter: Optional[RequestMeter] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionState:
     """Compacted state for token saving."""
     summary: str
@@ -61,6 +180,43 @@ class SessionState:
     current_task: str = ""
 
 
+SESSION_STATE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {
+            "type": "string"
+        },
+        "key_decisions": {
+            "type": "array",
+            "items": {
+                "type": "string"
+            }
+        },
+        "files_modified": {
+            "type": "array",
+            "items": {
+                "type": "string"
+            }
+        },
+        "current_task": {
+            "type": "string"
+        },
+    },
+    "required": ["summary", "key_decisions", "files_modified", "current_task"]
+}
+
+_COMPACTION_PROMPT = """Summarize the conversation so far in a concise way that preserves:
+1. Key decisions made
+2. Files created or modified
+3. Current task status
+4. Any errors encountered and how they were resolved
+
+If an earlier summary is present, only list decisions and files that aren't
+already in it, and give a summary covering everything.
+
+Be brief but complete."""
+
+
 class LLMError(Exception):
     """Base exception for LLM errors."""
     pass
@@ -68,7 +224,11 @@ class LLMError(Exception):
 
 class RateLimitError(LLMError):
     """Rate limit hit - should retry with backoff."""
-    pass
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Seconds to wait, when the provider said (e.g. a Retry-After header)
+        self.retry_after = retry_after
 
 
 class SafetyFilterError(LLMError):
@@ -91,6 +251,129 @@ class BadOutputError(LLMError):
     pass
 
 
+_json_decoder = json.JSONDecoder()
+
+
+@lru_cache(maxsize=32)
+def _compile_validator(schema_json: str) -> Any:
+    """
+    Build a validator for a serialized schema. Compiled once per schema.
+
+    fastjsonschema generates Python code for the schema, which validates
+    several times faster than jsonschema, so it's used when installed.
+    """
+    if FASTJSONSCHEMA_AVAILABLE:
+        return fastjsonschema.compile(json.loads(schema_json))
+    return jsonschema.Draft202012Validator(
+        json.loads(schema_json), format_checker=jsonschema.FormatChecker())
+
+
+# Validators by id(schema). Schemas are normally module-level constants, so
+# this skips re-serializing them to find their validator on every call. Each
+# entry holds a reference to its schema so the id can't be reused while it
+# is cached.
+_VALIDATORS: Dict[int, Tuple[Dict[str, Any], Any]] = {}
+_VALIDATORS_MAX = 64
+
+
+def _utf8_chunks(text: str, size: int = 65536) -> Iterator[bytes]:
+    """Encode text as UTF-8 a slice at a time, so it's never all in memory."""
+    for i in range(0, len(text), size):
+        yield text[i:i + size].encode("utf-8")
+
+
+def _utf8_size(text: str) -> int:
+    """Length of text in UTF-8 bytes, without encoding it all at once."""
+    if text.isascii():
+        return len(text)
+    return sum(map(len, _utf8_chunks(text)))
+
+
+def _schema_error(validator: Optional[Any], instance: Any) -> Optional[str]:
+    """The most relevant validation error for instance, if there is one."""
+    if validator is None:
+        return None
+    if FASTJSONSCHEMA_AVAILABLE:
+        try:
+            validator(instance)
+        except fastjsonschema.JsonSchemaValueException as e:
+            return e.message
+        return None
+    error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+    return None if error is None else error.message
+
+
+def _root_prefix(path: Union[str, Path]) -> str:
+    """
+    Resolved, case-normalized path with a trailing separator, so that
+    containment is a plain startswith() (and /a/bc isn't inside /a/b).
+
+    Resolved afresh on every call: a symlink swapped since an earlier check
+    must not keep its old resolution. (Allowed roots are resolved once, in
+    LLMSession.__init__.)
+    """
+    return os.path.join(os.path.normcase(os.path.realpath(os.fspath(path))),
+                        "")
+
+
+def _iter_json_array_items(chunks: Iterator[str],
+                           received: List[str]) -> Iterator[Any]:
+    """
+    Incrementally parse streamed JSON text, yielding the items of the first
+    array in it as each one completes. Chunks are appended to `received`.
+    """
+    buffer = ""
+    pos = -1  # Index just past the last consumed item, once inside the array
+    for chunk in chunks:
+        received.append(chunk)
+        buffer += chunk
+
+        # Items can only have completed if something that ends one arrived
+        if pos >= 0 and not any(c in chunk for c in "}],"):
+            continue
+
+        if pos < 0:
+            pos = buffer.find("[")
+            if pos < 0:
+                continue
+            pos += 1
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == "]":
+                break
+            try:
+                item, pos = _json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Item not complete yet
+            yield item
+
+        if pos < len(buffer) and buffer[pos] == "]":
+            # Array finished; drain the rest so it's recorded in history
+            for chunk in chunks:
+                received.append(chunk)
+            return
+
+    if pos < 0:
+        raise BadOutputError(
+            f"Expected a JSON array in response: {''.join(received)[:500]}")
+
+
+_MAX_PARALLEL_TOOL_CALLS = 8
+
+
+def _estimate_tokens(message: Message) -> int:
+    """Rough token count for a message, at ~4 characters per token."""
+    content = message.content
+    if not isinstance(content, str):
+        content = message.to_api_dict()["content"]
+    chars = len(content or "")
+    for tool_call in message.tool_calls or ():
+        chars += len(tool_call["function"]["arguments"])
+    return chars // 4
+
+
 class LLMSession(ABC):
     """
     Abstract base class for LLM API wrappers.
@@ -111,182 +394,351 @@ class LLMSession(ABC):
         allowed_write_paths: Optional[List[Path]] = None,
     ):
         self.config = config or LLMConfig()
-        self.messages: List[Message] = []
+        self.messages: Deque[Message] = deque()
+        # Bumped whenever self.messages changes other than by appending, so
+        # subclasses can keep anything derived from it up to date
+        # incrementally
+        self._history_version = 0
+        self._system_message: Optional[Message] = None
+        # The system prompt is kept at the head of the history so each API
+        # call sends a byte-identical prefix (and the provider's prompt cache
+        # can reuse it) without rebuilding the message list.
         self.system_prompt = system_prompt
+
+        # Running summary of compacted history, and the message holding it
+        self.state = SessionState(summary="")
+        self._state_message: Optional[Message] = None
         self.tools: Dict[str, ToolDefinition] = {}
+        # Bumped whenever self.tools changes, so subclasses can cache
+        # anything derived from it
+        self._tools_version = 0
         self.tool_call_count = 0
         self.bytes_read = 0
         self.bytes_written = 0
+        # Guards the counters above while tool calls run in parallel
+        self._tool_lock = threading.Lock()
 
         # File access restrictions
         self.allowed_read_paths = allowed_read_paths or []
         self.allowed_write_paths = allowed_write_paths or []
+        self._allowed_read_roots = tuple(
+            map(_root_prefix, self.allowed_read_paths))
+        self._allowed_write_roots = tuple(
+            map(_root_prefix, self.allowed_write_paths))
+        # Anything writable is also readable
+        self._readable_roots = (self._allowed_read_roots +
+                                self._allowed_write_roots)
 
         # Register built-in file tools
         self._register_file_tools()
 
+    @property
+    def system_prompt(self) -> str:
+        return self._system_message.content if self._system_message else ""
+
+    @system_prompt.setter
+    def system_prompt(self, system_prompt: str) -> None:
+        """Replace the system message at the head of the history."""
+        if self._system_message is not None:
+            self.messages.popleft()
+        self._system_message = None
+        if system_prompt:
+            self._system_message = Message(role=Role.SYSTEM,
+                                           content=system_prompt)
+            self.messages.appendleft(self._system_message)
+        self.token_count = sum(map(_estimate_tokens, self.messages))
+        self._history_version += 1
+
+    def _prefix_messages(self) -> List[Message]:
+        """The messages that always start the history."""
+        return [self._system_message] if self._system_message else []
+
     def _register_file_tools(self) -> None:
-        """Register built-in file read/write tools."""
-        self.register_tool(
-            ToolDefinition(
-                name="read_file",
-                description=
-                "Read contents of a file. Only allowed for permitted paths.",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Path to file to read"
-                        }
+        """
+        Register built-in file read/write tools.
+
+        A tool is only offered if some path is allowed for it; otherwise
+        every call would be denied and it would just cost prompt tokens.
+        """
+        if self._readable_roots:
+            self.register_tool(
+                ToolDefinition(
+                    name="read_file",
+                    description=
+                    "Read contents of a file. Only allowed for permitted paths.",
+                    parameters={
+                        "type": "object",
+                        "properties": {
+                            "path": {
+                                "type": "string",
+                                "description": "Path to file to read"
+                            }
+                        },
+                        "required": ["path"]
                     },
-                    "required": ["path"]
-                },
-                handler=self._tool_read_file))
-
-        self.register_tool(
-            ToolDefinition(
-                name="write_file",
-                description=
-                "Write contents to a file. Only allowed for permitted paths.",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Path to file to write"
+                    handler=self._tool_read_file,
+                    parallel=True))
+
+        if self._allowed_write_roots:
+            self.register_tool(
+                ToolDefinition(
+                    name="write_file",
+                    description=
+                    "Write contents to a file. Only allowed for permitted paths.",
+                    parameters={
+                        "type": "object",
+                        "properties": {
+                            "path": {
+                                "type": "string",
+                                "description": "Path to file to write"
+                            },
+                            "content": {
+                                "type": "string",
+                                "description": "Content to write"
+                            }
                         },
-                        "content": {
-                            "type": "string",
-                            "description": "Content to write"
-                        }
+                        "required": ["path", "content"]
                     },
-                    "required": ["path", "content"]
-                },
-                handler=self._tool_write_file))
-
-    def _is_path_allowed(self, path: Path, allowed_paths: List[Path]) -> bool:
-        """Check if path is within any allowed path."""
-        path = path.resolve()
-        for allowed in allowed_paths:
-            allowed = allowed.resolve()
-            try:
-                path.relative_to(allowed)
-                return True
-            except ValueError:
-                continue
-        return False
+                    handler=self._tool_write_file))
+
+    def _is_path_allowed(self, path: str,
+                         allowed_roots: Tuple[str, ...]) -> bool:
+        """Check if path is within any of the allowed roots (see _root_prefix)."""
+        if not allowed_roots:
+            return False
+        path = _root_prefix(path)
+        return any(path.startswith(root) for root in allowed_roots)
 
     def _tool_read_file(self, path: str) -> str:
         """Built-in tool: read a file."""
-        p = Path(path)
-        if not self._is_path_allowed(
-                p, self.allowed_read_paths + self.allowed_write_paths):
+        if not self._is_path_allowed(path, self._readable_roots):
             return f"Error: Access denied to path: {path}"
 
-        if not p.exists():
+        p = Path(path)
+        try:
+            size = p.stat().st_size
+        except FileNotFoundError:
             return f"Error: File not found: {path}"
+        except Exception as e:
+            return f"Error reading file: {e}"
 
-        try:
-            content = p.read_text(encoding="utf-8")
-            if self.bytes_read + len(content) > self.config.max_bytes_read:
+        # Check before reading, so a huge file is never loaded. The budget
+        # is reserved up front as reads may run in parallel.
+        with self._tool_lock:
+            if self.bytes_read + size > self.config.max_bytes_read:
                 return f"Error: Would exceed max bytes read limit ({self.config.max_bytes_read})"
-            self.bytes_read += len(content)
-            return content
+            self.bytes_read += size
+
+        data = b""
+        try:
+            with p.open("rb") as f:
+                # The file may have grown since the stat
+                data = f.read(size)
+            return data.decode("utf-8", errors="replace")
         except Exception as e:
             return f"Error reading file: {e}"
+        finally:
+            if len(data) != size:
+                with self._tool_lock:
+                    self.bytes_read -= size - len(data)
 
     def _tool_write_file(self, path: str, content: str) -> str:
         """Built-in tool: write a file."""
-        p = Path(path)
-        if not self._is_path_allowed(p, self.allowed_write_paths):
+        if not self._is_path_allowed(path, self._allowed_write_roots):
             return f"Error: Write access denied to path: {path}"
 
-        if self.bytes_written + len(content) > self.config.max_bytes_written:
+        p = Path(path)
+
+        size = _utf8_size(content)
+        if self.bytes_written + size > self.config.max_bytes_written:
             return f"Error: Would exceed max bytes written limit ({self.config.max_bytes_written})"
 
         try:
             p.parent.mkdir(parents=True, exist_ok=True)
-            p.write_text(content, encoding="utf-8")
-            self.bytes_written += len(content)
-            return f"Successfully wrote {len(content)} bytes to {path}"
+            with p.open("wb") as f:
+                for chunk in _utf8_chunks(content):
+                    f.write(chunk)
+            self.bytes_written += size
+            return f"Successfully wrote {size} bytes to {path}"
         except Exception as e:
             return f"Error writing file: {e}"
 
     def register_tool(self, tool: ToolDefinition) -> None:
         """Register a tool the LLM can call."""
+        tool.validator = self._get_validator(tool.parameters)
         self.tools[tool.name] = tool
+        self._tools_version += 1
 
-    def add_message(self, role: Role, content: str, **kwargs) -> None:
+    def add_message(self, role: Role, content: MessageContent,
+                    **kwargs) -> None:
         """Add a message to conversation history."""
-        self.messages.append(Message(role=role, content=content, **kwargs))
+        self._append_message(Message(role=role, content=content, **kwargs))
 
-    def compact_history(self) -> SessionState:
+    def _append_message(self, message: Message) -> None:
+        self.messages.append(message)
+        self.token_count += _estimate_tokens(message)
+
+    def _maybe_compact(self) -> None:
+        """Compact history if it's estimated to be over the token threshold."""
+        if self.token_count > self.config.compact_threshold_tokens:
+            self.compact_history()
+
+    def compact_history(self, keep_tail: int = 5) -> SessionState:
         """
         Compact conversation history to save tokens.
-        Returns a summary state and clears old messages.
+
+        Messages older than the last `keep_tail` are summarized by the LLM
+        and merged into a running SessionState, which replaces them as a
+        single system message after the system prompt. Later compactions
+        only summarize what has been added since, so earlier decisions
+        aren't lost by being re-summarized.
+
+        Returns the updated state.
         """
-        # Ask LLM to summarize the conversation
-        summary_prompt = """Summarize the conversation so far in a concise way that preserves:
-1. Key decisions made
-2. Files created or modified
-3. Current task status
-4. Any errors encountered and how they were resolved
+        prefix = self._prefix_messages()
+        start = len(prefix)
+        if (start < len(self.messages)
+                and self.messages[start] is self._state_message):
+            start += 1
 
-Be brief but complete."""
+        # Don't separate tool results from the call that requested them
+        end = len(self.messages) - keep_tail
+        while (start < end < len(self.messages)
+               and self.messages[end].role == Role.TOOL):
+            end -= 1
 
-        # For now, simple compaction - keep last few messages
-        state = SessionState(summary="Conversation compacted",
-                             key_decisions=[],
-                             files_modified=[],
-                             current_task="")
-
-        # Keep only recent messages
-        if len(self.messages) > 10:
-            # Create summary message
-            old_messages = self.messages[:-5]
-            summary_content = f"[Previous conversation summary: {len(old_messages)} messages compacted]"
-            self.messages = [
-                Message(role=Role.SYSTEM, content=summary_content)
-            ] + self.messages[-5:]
+        if end <= start:
+            return self.state
+
+        try:
+            update = self._retry_with_backoff(
+                self._call_api_structured, [
+                    *islice(self.messages, end),
+                    Message(role=Role.USER, content=_COMPACTION_PROMPT)
+                ], SESSION_STATE_SCHEMA)
+        except LLMError as e:
+            print(f"Failed to summarize history, keeping it as is: {e}")
+            return self.state
+
+        state = self.state
+        state.summary = update.get("summary", state.summary)
+        for field_name in ("key_decisions", "files_modified"):
+            merged = getattr(state, field_name)
+            for item in update.get(field_name, []):
+                if item not in merged:
+                    merged.append(item)
+        state.current_task = update.get("current_task", state.current_task)
+
+        self._state_message = Message(role=Role.SYSTEM,
+                                      content="[Conversation so far]\n" +
+                                      json.dumps(asdict(state), indent=2))
+        # Pop everything up to the end of the span off the front, then put
+        # the system prompt and new state back in its place
+        for _ in range(end):
+            self.messages.popleft()
+        self.messages.appendleft(self._state_message)
+        self.messages.extendleft(reversed(prefix))
+        self.token_count = sum(map(_estimate_tokens, self.messages))
+        self._history_version += 1
 
         return state
 
     def _execute_tool_call(self, name: str, arguments: Dict[str, Any]) -> str:
         """Execute a tool call and return the result."""
-        if self.tool_call_count >= self.config.max_tool_calls:
-            return f"Error: Maximum tool call limit ({self.config.max_tool_calls}) reached"
-
         if name not in self.tools:
             return f"Error: Unknown tool: {name}"
 
-        self.tool_call_count += 1
+        with self._tool_lock:
+            if self.tool_call_count >= self.config.max_tool_calls:
+                return f"Error: Maximum tool call limit ({self.config.max_tool_calls}) reached"
+            self.tool_call_count += 1
         tool = self.tools[name]
 
+        error = _schema_error(tool.validator, arguments)
+        if error is not None:
+            return f"Error: Invalid arguments for tool {name}: {error}"
+
         try:
             return tool.handler(**arguments)
         except Exception as e:
             return f"Error executing tool {name}: {e}"
 
+    def _run_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        """
+        Run the tool calls from one response, returning results in order.
+
+        Calls to tools marked `parallel` (such as read_file) are independent
+        I/O, so when that's all there is they run on a thread pool.
+        """
+        names = [tc["function"]["name"] for tc in tool_calls]
+        if len(names) > 1 and all(
+                name in self.tools and self.tools[name].parallel
+                for name in names):
+            with ThreadPoolExecutor(
+                    max_workers=min(len(tool_calls),
+                                    _MAX_PARALLEL_TOOL_CALLS)) as executor:
+                return list(executor.map(self._run_tool_call, tool_calls))
+
+        return [self._run_tool_call(tc) for tc in tool_calls]
+
+    def _run_tool_call(self, tool_call: Dict[str, Any]) -> str:
+        """
+        Parse a tool call's arguments and execute it.
+
+        Oversized or malformed arguments are reported back to the model as
+        the tool's result, so every call in the response still gets one.
+        """
+        name = tool_call["function"]["name"]
+        arguments = tool_call["function"]["arguments"]
+
+        if len(arguments) > self.config.max_tool_args_chars:
+            return f"Error: Arguments for tool {name} are too long ({len(arguments)} characters, max {self.config.max_tool_args_chars})"
+
+        try:
+            if ORJSON_AVAILABLE:
+                args = orjson.loads(arguments)
+            else:
+                args = json.loads(arguments)
+        except ValueError as e:  # Both decoders' errors subclass ValueError
+            return f"Error: Arguments for tool {name} aren't valid JSON: {e}"
+        if not isinstance(args, dict):
+            return f"Error: Arguments for tool {name} must be a JSON object"
+
+        return self._execute_tool_call(name, args)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """
+        Delay before retry number `attempt` (zero-based).
+
+        Jittered so that sessions rate limited together don't all retry at
+        the same moment and collide again.
+        """
+        delay = min(self.config.retry_max_delay,
+                    self.config.retry_base_delay * (2**attempt))
+        jitter = self.config.retry_jitter
+        return delay * (1 + random.uniform(-jitter, jitter))
+
     def _retry_with_backoff(self, func: Callable, *args, **kwargs) -> Any:
         """Execute function with exponential backoff on rate limits."""
         last_error = None
 
         for attempt in range(self.config.max_retries):
+            if self.config.request_meter is not None:
+                self.config.request_meter.wait()
             try:
                 return func(*args, **kwargs)
             except RateLimitError as e:
                 last_error = e
-                delay = self.config.retry_base_delay * (2**attempt)
+                delay = e.retry_after or self._backoff_delay(attempt)
                 print(
-                    f"Rate limited, waiting {delay}s before retry {attempt + 1}/{self.config.max_retries}"
+                    f"Rate limited, waiting {delay:.1f}s before retry {attempt + 1}/{self.config.max_retries}"
                 )
                 time.sleep(delay)
             except NetworkError as e:
                 last_error = e
-                delay = self.config.retry_base_delay * (2**attempt)
+                delay = self._backoff_delay(attempt)
                 print(
-                    f"Network error, waiting {delay}s before retry {attempt + 1}/{self.config.max_retries}"
+                    f"Network error, waiting {delay:.1f}s before retry {attempt + 1}/{self.config.max_retries}"
                 )
                 time.sleep(delay)
             except BadOutputError as e:
@@ -301,6 +753,82 @@ Be brief but complete."""
 
         raise last_error or LLMError("Max retries exceeded")
 
+    async def _aretry_with_backoff(self, func: Callable, *args,
+                                   **kwargs) -> Any:
+        """Async counterpart of _retry_with_backoff for coroutine functions."""
+        last_error = None
+
+        for attempt in range(self.config.max_retries):
+            if self.config.request_meter is not None:
+                await self.config.request_meter.await_turn()
+            try:
+                return await func(*args, **kwargs)
+            except RateLimitError as e:
+                last_error = e
+                delay = e.retry_after or self._backoff_delay(attempt)
+                print(
+                    f"Rate limited, waiting {delay:.1f}s before retry {attempt + 1}/{self.config.max_retries}"
+                )
+                await asyncio.sleep(delay)
+            except NetworkError as e:
+                last_error = e
+                delay = self._backoff_delay(attempt)
+                print(
+                    f"Network error, waiting {delay:.1f}s before retry {attempt + 1}/{self.config.max_retries}"
+                )
+                await asyncio.sleep(delay)
+            except BadOutputError as e:
+                last_error = e
+                print(
+                    f"Bad output, retrying {attempt + 1}/{self.config.max_retries}"
+                )
+                continue
+            except (SafetyFilterError, OutOfCreditsError):
+                # Fatal errors - don't retry
+                raise
+
+        raise last_error or LLMError("Max retries exceeded")
+
+    def _get_validator(self, schema: Dict[str, Any]) -> Optional[Any]:
+        """
+        Reusable validator for `schema`, or None if neither fastjsonschema
+        nor jsonschema is installed.
+        """
+        if not (FASTJSONSCHEMA_AVAILABLE or JSONSCHEMA_AVAILABLE):
+            return None
+
+        entry = _VALIDATORS.get(id(schema))
+        if entry is not None and entry[0] is schema:
+            return entry[1]
+
+        validator = _compile_validator(json.dumps(schema, sort_keys=True))
+        if len(_VALIDATORS) >= _VALIDATORS_MAX:
+            _VALIDATORS.clear()
+        _VALIDATORS[id(schema)] = (schema, validator)
+        return validator
+
+    @staticmethod
+    def _check_structured(result: Dict[str, Any], validator: Any) -> None:
+        error = _schema_error(validator, result)
+        if error is not None:
+            raise BadOutputError(f"Response doesn't match schema: {error}")
+
+    def _call_api_validated(self, messages: List[Message],
+                            schema: Dict[str, Any],
+                            validator: Any) -> Dict[str, Any]:
+        """_call_api_structured, with a schema mismatch treated as bad output."""
+        result = self._call_api_structured(messages, schema)
+        self._check_structured(result, validator)
+        return result
+
+    async def _acall_api_validated(self, messages: List[Message],
+                                   schema: Dict[str, Any],
+                                   validator: Any) -> Dict[str, Any]:
+        """Async counterpart of _call_api_validated."""
+        result = await self._acall_api_structured(messages, schema)
+        self._check_structured(result, validator)
+        return result
+
     @abstractmethod
     def _call_api(self, messages: List[Message]) -> Message:
         """
@@ -330,65 +858,223 @@ Be brief but complete."""
         """
         pass
 
+    async def _acall_api(self, messages: List[Message]) -> Message:
+        """
+        Async counterpart of _call_api.
+
+        Subclasses with a native async client should override this; the
+        default runs the blocking call on a worker thread.
+        """
+        return await asyncio.to_thread(self._call_api, messages)
+
+    async def _acall_api_structured(self, messages: List[Message],
+                                    schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Async counterpart of _call_api_structured."""
+        return await asyncio.to_thread(self._call_api_structured, messages,
+                                       schema)
+
+    def _stream_api(self, messages: List[Message]) -> Iterator[str]:
+        """
+        Start a tool-free completion and return an iterator of text chunks.
+
+        The request should be made eagerly so that _retry_with_backoff sees
+        any errors. The default makes one blocking call and yields it whole.
+        """
+        return iter([self._call_api(messages).content])
+
+    def _stream_api_structured(self, messages: List[Message],
+                               schema: Dict[str, Any]) -> Iterator[str]:
+        """
+        Structured counterpart of _stream_api, yielding raw JSON text.
+
+        The default makes one blocking call and yields it whole.
+        """
+        return iter([json.dumps(self._call_api_structured(messages, schema))])
+
+    def build_messages(
+            self,
+            dynamic_context: Optional[List[Message]] = None
+    ) -> Sequence[Message]:
+        """
+        Messages for an API call: the history (which starts with the system
+        prompt), followed by any not-yet-committed messages.
+
+        Without dynamic context the history deque itself is returned, so it
+        must not be modified by the caller.
+        """
+        if not dynamic_context:
+            return self.messages
+        return [*self.messages, *dynamic_context]
+
     def chat(self, user_message: str) -> str:
         """
         Send a message and get a response, handling tool calls automatically.
         """
         self.add_message(Role.USER, user_message)
 
+        if not self.tools:
+            # Nothing the model could call, so it's always a single round
+            self._maybe_compact()
+            response = self._retry_with_backoff(self._call_api,
+                                                self.build_messages())
+            self._append_message(response)
+            return response.content
+
         while True:
-            # Prepare messages for API
-            api_messages = []
-            if self.system_prompt:
-                api_messages.append(
-                    Message(role=Role.SYSTEM, content=self.system_prompt))
-            api_messages.extend(self.messages)
+            # Tool results can be large, so check before every round
+            self._maybe_compact()
 
             # Call API with retry
-            response = self._retry_with_backoff(self._call_api, api_messages)
-            self.messages.append(response)
+            response = self._retry_with_backoff(self._call_api,
+                                                self.build_messages())
+            self._append_message(response)
 
             # Handle tool calls
             if response.tool_calls:
-                for tool_call in response.tool_calls:
-                    name = tool_call["function"]["name"]
-                    args = json.loads(tool_call["function"]["arguments"])
-                    result = self._execute_tool_call(name, args)
-
+                results = self._run_tool_calls(response.tool_calls)
+                for tool_call, result in zip(response.tool_calls, results):
                     self.add_message(Role.TOOL,
                                      result,
                                      tool_call_id=tool_call["id"],
-                                     name=name)
+                                     name=tool_call["function"]["name"])
                 # Continue loop to get next response after tool results
                 continue
 
             # No tool calls - return the response
             return response.content
 
-    def chat_structured(self, user_message: str,
-                        schema: Dict[str, Any]) -> Dict[str, Any]:
+    def chat_structured(self,
+                        user_message: str,
+                        schema: Dict[str, Any],
+                        ephemeral_suffix: str = "") -> Dict[str, Any]:
         """
         Send a message and get a structured JSON response.
+
+        Put content that repeats between calls (spec, interface, rules) in
+        user_message and anything call-specific in ephemeral_suffix. The
+        suffix is sent as a separate message after it, so the provider's
+        prompt cache can reuse everything up to the end of user_message.
         """
+        self._maybe_compact()
         self.add_message(Role.USER, user_message)
+        if ephemeral_suffix:
+            self.add_message(Role.USER, ephemeral_suffix)
 
-        api_messages = []
-        if self.system_prompt:
-            api_messages.append(
-                Message(role=Role.SYSTEM, content=self.system_prompt))
-        api_messages.extend(self.messages)
-
-        result = self._retry_with_backoff(self._call_api_structured,
-                                          api_messages, schema)
+        result = self._retry_with_backoff(self._call_api_validated,
+                                          self.build_messages(), schema,
+                                          self._get_validator(schema))
 
         # Add response to history
-        self.add_message(Role.ASSISTANT, json.dumps(result))
+        self.add_message(Role.ASSISTANT, result)
+
+        return result
+
+    def stream_chat(self, user_message: str) -> Iterator[str]:
+        """
+        Send a message and yield the response text as it arrives.
+
+        Tools are not offered on streamed turns. Whatever was received is
+        added to history when the stream ends, or when the caller stops
+        iterating early.
+        """
+        self._maybe_compact()
+        self.add_message(Role.USER, user_message)
+
+        chunks = self._retry_with_backoff(self._stream_api,
+                                          self.build_messages())
+        received: List[str] = []
+        try:
+            for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            self.add_message(Role.ASSISTANT, "".join(received))
+
+    def chat_structured_stream(self,
+                               user_message: str,
+                               schema: Dict[str, Any],
+                               ephemeral_suffix: str = "") -> Iterator[Any]:
+        """
+        Like chat_structured() for a response holding a JSON array, but
+        yields each array item as soon as it has been received.
+
+        If the response is an object, the first array inside it is used.
+        Close the generator to abandon the response early; whatever was
+        received is added to history either way.
+        """
+        self._maybe_compact()
+        self.add_message(Role.USER, user_message)
+        if ephemeral_suffix:
+            self.add_message(Role.USER, ephemeral_suffix)
+
+        chunks = self._retry_with_backoff(self._stream_api_structured,
+                                          self.build_messages(), schema)
+        received: List[str] = []
+        try:
+            yield from _iter_json_array_items(chunks, received)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            self.add_message(Role.ASSISTANT, "".join(received))
+
+    async def achat(self, user_message: str) -> str:
+        """
+        Async counterpart of chat().
+
+        The turn is built up locally and only committed to history once it
+        completes, so independent achat/achat_structured calls can run
+        concurrently on the same session without interleaving their turns.
+        """
+        turn = [Message(role=Role.USER, content=user_message)]
+
+        while True:
+            response = await self._aretry_with_backoff(
+                self._acall_api, self.build_messages(turn))
+            turn.append(response)
+
+            if response.tool_calls:
+                results = self._run_tool_calls(response.tool_calls)
+                for tool_call, result in zip(response.tool_calls, results):
+                    turn.append(
+                        Message(role=Role.TOOL,
+                                content=result,
+                                tool_call_id=tool_call["id"],
+                                name=tool_call["function"]["name"]))
+                continue
+
+            for message in turn:
+                self._append_message(message)
+            return response.content
+
+    async def achat_structured(self, user_message: str,
+                               schema: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async counterpart of chat_structured(). See achat() for how history
+        is kept consistent under concurrency.
+        """
+        user = Message(role=Role.USER, content=user_message)
+
+        result = await self._aretry_with_backoff(self._acall_api_validated,
+                                                 self.build_messages([user]),
+                                                 schema,
+                                                 self._get_validator(schema))
+
+        self._append_message(user)
+        self.add_message(Role.ASSISTANT, result)
 
         return result
 
     def reset(self) -> None:
         """Clear conversation history and counters."""
-        self.messages.clear()
+        self.messages = deque(self._prefix_messages())
+        self.token_count = sum(map(_estimate_tokens, self.messages))
+        self._history_version += 1
+        self.state = SessionState(summary="")
+        self._state_message = None
         self.tool_call_count = 0
         self.bytes_read = 0
         self.bytes_written = 0
@@ -1,9 +1,12 @@
 # markdown_db.py
 from __future__ import annotations
 
+import hashlib
 import os
 import re
+from array import array
 from enum import Enum
+from itertools import accumulate
 from pathlib import Path
 from typing import Iterator, List, Optional, Sequence, TextIO, Union
 
@@ -34,15 +37,147 @@ def _strip_linebreaks_only(text: str) -> str:
     return text.rstrip("\r\n")
 
 
+# Whitespace and markers that turn up on most lines. Slicing makes a new
+# string each time (only "" and single characters are shared), so the
+# parser swaps in these instances instead of keeping thousands of copies.
+_COMMON_TRIVIA = {
+    s: s
+    for s in ("  ", "   ", "    ", "\r\n", "\n\n", "\r\n\r\n", "# ", "## ",
+              "### ", "#### ", "##### ", "###### ", "- ", "* ", "+ ", "1. ")
+}
+_intern_trivia = _COMMON_TRIVIA.get
+
+
 def _split_trivia(raw: str) -> tuple[str, str, str]:
-    # (leading whitespace, core, trailing whitespace). \s includes newlines.
-    m = re.match(r"(\s*)(.*?)(\s*)\Z", raw, flags=re.DOTALL)
-    if not m:
-        return "", raw, ""
-    return m.group(1), m.group(2), m.group(3)
+    # (leading whitespace, core, trailing whitespace). str.strip() uses the
+    # same definition of whitespace as \s, newlines included.
+    stripped = raw.lstrip()
+    lead_len = len(raw) - len(stripped)
+    core = stripped.rstrip()
+    leading = raw[:lead_len]
+    trailing = stripped[len(core):]
+    return (_intern_trivia(leading, leading), core,
+            _intern_trivia(trailing, trailing))
+
+
+_BLOCKQUOTE_RE = re.compile(r"^>[ ]?")
+# Opening or closing line of a code block; "rest" is the info string on
+# an opening line and any trailing text on a closing one.
+_CODE_FENCE_RE = re.compile(
+    r"^(?P<indent>[ \t]*)(?P<fence>`{3,}|~{3,})(?P<rest>[^\r\n]*?)(?P<eol>\r?\n)?\Z"
+)
+
+
+# Line kinds, as classified by _classify_lines
+_LINE_TEXT = 0
+_LINE_BLANK = 1
+_LINE_HEADING = 2
+_LINE_FENCE = 3
+_LINE_LIST_ITEM = 4
+_LINE_QUOTE = 5
+
+
+def _split_eol(line: str) -> tuple[str, str]:
+    # (line without its "\n" or "\r\n", that line ending). Any other line
+    # break that splitlines() ends a line on is left as content.
+    if line[-1:] == "\n":
+        if line[-2:] == "\r\n":
+            return line[:-2], "\r\n"
+        return line[:-1], "\n"
+    return line, ""
+
+
+def _classify_lines(lines: Sequence[str]) -> tuple[bytearray, dict[int, tuple]]:
+    # A hand-written scanner for the block-starting lines, which are
+    #   heading:   [ \t]*  #{1,6}  [ \t]+  title  [ \t]*  \r?\n?
+    #   fence:     [ \t]*  `{3,} or ~{3,}  [^\r\n]*  \r?\n?
+    #   list item: [ \t]*  [-*+] or \d+\.  [ \t]+  content  \r?\n?
+    # Which one (if any) a line can be is decided by its first non-blank
+    # character, then a few string operations pick it apart.
+    #
+    # Returns the kind of each line, and for heading, fence and list lines
+    # their parts, by line number:
+    #   heading:   (level, prefix, title, line_suffix)
+    #   fence:     (fence_char, fence_len)
+    #   list item: (indent, marker, space, content, eol)
+    kinds = bytearray(len(lines))
+    parts: dict[int, tuple] = {}
+    for n, line in enumerate(lines):
+        body = line.lstrip(" \t")
+        c = body[:1]
+        if c == "\n" or c == "\r":
+            if body == "\n" or body == "\r\n":
+                kinds[n] = _LINE_BLANK
+
+        elif c == "#":
+            after = body.lstrip("#")
+            level = len(body) - len(after)
+            if level > 6:
+                continue
+            rest, eol = _split_eol(after)
+            title = rest.lstrip(" \t")
+            if len(title) == len(rest):  # Needs a space after the hashes
+                continue
+            core = title.rstrip(" \t")
+            prefix = line[:len(line) - len(title) - len(eol)]
+            suffix = title[len(core):] + eol
+            kinds[n] = _LINE_HEADING
+            parts[n] = (level, _intern_trivia(prefix, prefix), core,
+                        _intern_trivia(suffix, suffix))
+
+        elif c == "`" or c == "~":
+            fence_len = len(body) - len(body.lstrip(c))
+            if fence_len < 3:
+                continue
+            info = _split_eol(body)[0]
+            if "\n" in info or "\r" in info:
+                continue
+            kinds[n] = _LINE_FENCE
+            parts[n] = (c, fence_len)
+
+        elif c == ">":
+            if line[0] == ">":  # Quotes can't be indented
+                kinds[n] = _LINE_QUOTE
+
+        elif c == "-" or c == "*" or c == "+" or c.isdecimal():
+            if c.isdecimal():
+                digits = len(body) - len(body.lstrip("0123456789"))
+                # lstrip only knows ASCII digits, but any decimal counts
+                while body[digits:digits + 1].isdecimal():
+                    digits += 1
+                if body[digits:digits + 1] != ".":
+                    continue
+                marker = body[:digits + 1]
+            else:
+                marker = c
+            rest, eol = _split_eol(body[len(marker):])
+            content = rest.lstrip(" \t")
+            if len(content) == len(rest):  # Needs a space after the marker
+                continue
+            indent = line[:len(line) - len(body)]
+            kinds[n] = _LINE_LIST_ITEM
+            parts[n] = (_intern_trivia(indent, indent), marker,
+                        rest[:len(rest) - len(content)], content, eol)
+    return kinds, parts
+
+
+def _is_close_fence(line: str, fence_char: str, fence_len: int) -> bool:
+    # Indent, then at least fence_len fence characters. Anything may follow;
+    # lines come from splitlines so can only hold line breaks at the end.
+    s = line.lstrip(" \t")
+    return len(s) - len(s.lstrip(fence_char)) >= fence_len
 
 
 class MarkdownNode:
+    __slots__ = (
+        "Type",
+        "_parent",
+        "_children",
+        "_dirty_self",
+        "_dirty_subtree",
+        "_source",
+        "_span",
+    )
 
     def __init__(self,
                  node_type: NodeType,
@@ -52,6 +187,14 @@ class MarkdownNode:
         self._parent: Optional["MarkdownNode"] = parent
         self._children: List["MarkdownNode"] = []
         self._dirty_self: bool = False
+        # Number of nodes below this one that have been marked dirty, kept up
+        # to date by MarkDirty/AddChild so IsDirty needn't walk the subtree.
+        self._dirty_subtree: int = 0
+        # For nodes from Parse: the document source and this node's
+        # [start, end) in it. Until the node is edited that slice is its
+        # markdown, subtree included.
+        self._source: Optional[str] = None
+        self._span: Optional[tuple[int, int]] = None
 
     # Container behaviour
     def __iter__(self) -> Iterator["MarkdownNode"]:
@@ -75,7 +218,15 @@ class MarkdownNode:
     def AddChild(self, child: "MarkdownNode") -> None:
         child._parent = self
         self._children.append(child)
+        if child.IsDirty:
+            child._PropagateDirty()
         self.MarkDirty()
+        self._StructureChanged()
+
+    def _StructureChanged(self) -> None:
+        # Tell the document, which may have indexed the tree
+        if self._parent is not None:
+            self._parent._StructureChanged()
 
     # Parser attach: do not mark dirty
     def _AppendChildParsed(self, child: "MarkdownNode") -> None:
@@ -83,9 +234,12 @@ class MarkdownNode:
         self._children.append(child)
 
     def Walk(self) -> Iterator["MarkdownNode"]:
-        yield self
-        for child in self._children:
-            yield from child.Walk()
+        # Pre-order, using a stack rather than a generator per level
+        stack: List["MarkdownNode"] = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node._children))
 
     def FindAll(self, node_type: NodeType) -> Iterator["MarkdownNode"]:
         for node in self.Walk():
@@ -94,12 +248,25 @@ class MarkdownNode:
 
     @property
     def IsDirty(self) -> bool:
-        if self._dirty_self:
-            return True
-        return any(c.IsDirty for c in self._children)
+        return self._dirty_self or self._dirty_subtree > 0
+
+    def _SourceText(self) -> Optional[str]:
+        if self._span is None or self.IsDirty:
+            return None
+        start, end = self._span
+        return self._source[start:end]
 
     def MarkDirty(self) -> None:
+        if self._dirty_self:
+            return  # Ancestors already know
         self._dirty_self = True
+        self._PropagateDirty()
+
+    def _PropagateDirty(self) -> None:
+        p = self._parent
+        while p is not None:
+            p._dirty_subtree += 1
+            p = p._parent
 
     # Text API (override in nodes that have it)
     @property
@@ -113,9 +280,29 @@ class MarkdownNode:
 
     # Serialisation
     def ToMarkdown(self) -> str:
-        return "".join(child.ToMarkdown() for child in self._children)
+        text = self._SourceText()
+        if text is not None:
+            return text
+        out: List[str] = []
+        self._WriteMarkdown(out)
+        return "".join(out)
+
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        # Append this node's markdown to out. Nodes with children override
+        # this rather than ToMarkdown, so a tree is joined once at the top
+        # instead of once per level.
+        for child in self._children:
+            child._WriteMarkdown(out)
 
     def ToString(self) -> str:
+        if self._span is not None and not self.IsDirty:
+            # Trim the span rather than a serialised copy of it, so the
+            # text is only copied once
+            source = self._source
+            start, end = self._span
+            while end > start and source[end - 1] in "\r\n":
+                end -= 1
+            return source[start:end]
         return _strip_linebreaks_only(self.ToMarkdown())
 
     def ToPlainText(self) -> str:
@@ -135,6 +322,7 @@ class MarkdownNode:
 
 
 class TextNode(MarkdownNode):
+    __slots__ = ("_raw_original", "_leading", "_core", "_trailing")
 
     def __init__(self,
                  raw: str,
@@ -142,27 +330,51 @@ class TextNode(MarkdownNode):
                  parent: Optional[MarkdownNode] = None) -> None:
         super().__init__(NodeType.Text, parent=parent)
         self._raw_original: str = raw
-        self._leading, self._core, self._trailing = _split_trivia(raw)
+        # Split into trivia on first use; most nodes are never edited.
+        self._core: Optional[str] = None
+
+    def _Split(self) -> None:
+        if self._core is None:
+            self._leading, self._core, self._trailing = _split_trivia(
+                self._raw_original)
 
     @property
     def Text(self) -> str:
+        self._Split()
         return self._core
 
     @Text.setter
     def Text(self, value: str) -> None:
+        self._Split()
         self._core = value.strip()
         self.MarkDirty()
 
     def ToMarkdown(self) -> str:
         if not self.IsDirty:
             return self._raw_original
+        self._Split()
         return f"{self._leading}{self._core}{self._trailing}"
 
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        out.append(self.ToMarkdown())
+
     def ToPlainText(self) -> str:
         return self.ToMarkdown()
 
 
 class LinkNode(MarkdownNode):
+    __slots__ = (
+        "_raw_original",
+        "_is_image",
+        "_label_raw",
+        "_href_raw",
+        "_label_leading",
+        "_label_core",
+        "_label_trailing",
+        "_href_leading",
+        "_href_core",
+        "_href_trailing",
+    )
 
     def __init__(self,
                  raw: str,
@@ -176,38 +388,55 @@ class LinkNode(MarkdownNode):
         self._raw_original: str = raw
         self._is_image: bool = is_image
 
-        self._label_leading, self._label_core, self._label_trailing = _split_trivia(
-            label)
-        self._href_leading, self._href_core, self._href_trailing = _split_trivia(
-            href)
+        # Split into trivia on first use; most nodes are never edited.
+        self._label_raw: str = label
+        self._href_raw: str = href
+        self._label_core: Optional[str] = None
+
+    def _Split(self) -> None:
+        if self._label_core is None:
+            self._label_leading, self._label_core, self._label_trailing = _split_trivia(
+                self._label_raw)
+            self._href_leading, self._href_core, self._href_trailing = _split_trivia(
+                self._href_raw)
 
     @property
     def Text(self) -> str:
+        self._Split()
         return self._label_core
 
     @Text.setter
     def Text(self, value: str) -> None:
+        self._Split()
         self._label_core = value.strip()
         self.MarkDirty()
 
     @property
     def Href(self) -> str:
+        self._Split()
         return self._href_core
 
     @Href.setter
     def Href(self, value: str) -> None:
+        self._Split()
         self._href_core = value.strip()
         self.MarkDirty()
 
     def ToMarkdown(self) -> str:
         if not self.IsDirty:
             return self._raw_original
+        self._Split()
         bang = "!" if self._is_image else ""
         label = f"{self._label_leading}{self._label_core}{self._label_trailing}"
         href = f"{self._href_leading}{self._href_core}{self._href_trailing}"
         return f"{bang}[{label}]({href})"
 
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        out.append(self.ToMarkdown())
+
     def ToPlainText(self) -> str:
+        if self._label_core is None:
+            return self._label_raw
         return f"{self._label_leading}{self._label_core}{self._label_trailing}"
 
 
@@ -217,6 +446,22 @@ class CodeBlockNode(MarkdownNode):
     Stored losslessly; editable via Text (code body) and InfoString.
     """
 
+    __slots__ = (
+        "_opening_line_original",
+        "_closing_line_original",
+        "_block_suffix_original",
+        "_opening_prefix",
+        "_fence",
+        "_info",
+        "_opening_eol",
+        "_closing_indent",
+        "_closing_fence",
+        "_closing_trailing",
+        "_closing_eol",
+        "_code_body_original",
+        "_code_body_current",
+    )
+
     def __init__(self,
                  opening_line: str,
                  code_body: str,
@@ -229,33 +474,27 @@ class CodeBlockNode(MarkdownNode):
         self._closing_line_original = closing_line
         self._block_suffix_original = block_suffix
 
-        self._opening_prefix, self._fence, self._info, self._opening_eol = self._parse_opening(
-            opening_line)
-        self._closing_indent, self._closing_fence, self._closing_trailing, self._closing_eol = self._parse_closing(
-            closing_line)
+        # The fence lines are only picked apart when the info string is
+        # needed or the block is re-serialised after an edit
+        self._fence: Optional[str] = None
 
         self._code_body_original = code_body
         self._code_body_current = code_body
 
-    @staticmethod
-    def _parse_opening(line: str) -> tuple[str, str, str, str]:
-        m = re.match(
-            r"^(?P<indent>[ \t]*)(?P<fence>`{3,}|~{3,})(?P<info>[^\r\n]*?)(?P<eol>\r?\n)?\Z",
-            line)
-        if not m:
-            return "", "```", "", "\n" if line.endswith("\n") else ""
-        return m.group("indent"), m.group("fence"), m.group(
-            "info"), m.group("eol") or ""
+    def _ParseFences(self) -> None:
+        if self._fence is None:
+            self._opening_prefix, self._fence, self._info, self._opening_eol = self._parse_fence_line(
+                self._opening_line_original)
+            self._closing_indent, self._closing_fence, self._closing_trailing, self._closing_eol = self._parse_fence_line(
+                self._closing_line_original)
 
     @staticmethod
-    def _parse_closing(line: str) -> tuple[str, str, str, str]:
-        m = re.match(
-            r"^(?P<indent>[ \t]*)(?P<fence>`{3,}|~{3,})(?P<trailing>[^\r\n]*?)(?P<eol>\r?\n)?\Z",
-            line)
+    def _parse_fence_line(line: str) -> tuple[str, str, str, str]:
+        m = _CODE_FENCE_RE.match(line)
         if not m:
             return "", "```", "", "\n" if line.endswith("\n") else ""
         return m.group("indent"), m.group("fence"), m.group(
-            "trailing"), m.group("eol") or ""
+            "rest"), m.group("eol") or ""
 
     @property
     def Text(self) -> str:
@@ -268,10 +507,12 @@ class CodeBlockNode(MarkdownNode):
 
     @property
     def InfoString(self) -> str:
+        self._ParseFences()
         return self._info.strip()
 
     @InfoString.setter
     def InfoString(self, value: str) -> None:
+        self._ParseFences()
         self._info = " " + value.strip() if value.strip() else ""
         self.MarkDirty()
 
@@ -280,12 +521,27 @@ class CodeBlockNode(MarkdownNode):
             return (self._opening_line_original + self._code_body_original +
                     self._closing_line_original + self._block_suffix_original)
 
+        self._ParseFences()
         opening = f"{self._opening_prefix}{self._fence}{self._info}{self._opening_eol}"
         closing = f"{self._closing_indent}{self._closing_fence}{self._closing_trailing}{self._closing_eol}"
         return opening + self._code_body_current + closing + self._block_suffix_original
 
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        out.append(self.ToMarkdown())
+
 
 class HeadingNode(MarkdownNode):
+    __slots__ = (
+        "Level",
+        "_raw_line_original",
+        "_prefix",
+        "_title_raw",
+        "_title_leading",
+        "_title_core",
+        "_title_trailing",
+        "_line_suffix",
+        "_block_suffix",
+    )
 
     def __init__(
         self,
@@ -303,28 +559,42 @@ class HeadingNode(MarkdownNode):
 
         self._raw_line_original = raw_line
         self._prefix = prefix
-        self._title_leading, self._title_core, self._title_trailing = _split_trivia(
-            title_raw)
+        # Split into trivia on first use; most headings are never edited.
+        self._title_raw = title_raw
+        self._title_core: Optional[str] = None
         self._line_suffix = line_suffix
         self._block_suffix = block_suffix
 
+    def _SplitTitle(self) -> None:
+        if self._title_core is None:
+            self._title_leading, self._title_core, self._title_trailing = _split_trivia(
+                self._title_raw)
+
     @property
     def Text(self) -> str:
+        self._SplitTitle()
         return self._title_core
 
     @Text.setter
     def Text(self, value: str) -> None:
+        self._SplitTitle()
         self._title_core = value.strip()
         self.MarkDirty()
 
-    def ToMarkdown(self) -> str:
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        text = self._SourceText()
+        if text is not None:
+            out.append(text)
+            return
         if not self._dirty_self:
-            line = self._raw_line_original
+            out.append(self._raw_line_original)
         else:
+            self._SplitTitle()
             title = f"{self._title_leading}{self._title_core}{self._title_trailing}"
-            line = f"{self._prefix}{title}{self._line_suffix}"
-        return line + self._block_suffix + "".join(child.ToMarkdown()
-                                                   for child in self._children)
+            out.append(f"{self._prefix}{title}{self._line_suffix}")
+        out.append(self._block_suffix)
+        for child in self._children:
+            child._WriteMarkdown(out)
 
 
 def _try_parse_link(raw: str, pos: int, *,
@@ -357,6 +627,10 @@ def _try_parse_link(raw: str, pos: int, *,
 
 
 def _parse_inlines(raw: str) -> List[MarkdownNode]:
+    # Most blocks have no links; let a C-level scan rule that out first
+    if "[" not in raw:
+        return [TextNode(raw)] if raw else []
+
     nodes: List[MarkdownNode] = []
     buffer_start = 0
     i = 0
@@ -367,36 +641,73 @@ def _parse_inlines(raw: str) -> List[MarkdownNode]:
             nodes.append(TextNode(raw[buffer_start:until]))
         buffer_start = until
 
-    while i < len(raw):
-        if raw.startswith("![", i):
-            parsed = _try_parse_link(raw, i, is_image=True)
-            if parsed:
-                start, end, label, href = parsed
-                flush_text(start)
-                nodes.append(
-                    LinkNode(raw[start:end], label, href, is_image=True))
-                i = end
-                buffer_start = i
-                continue
+    n = len(raw)
+    while i < n:
+        # Jump straight to the next candidate; everything before it is text
+        j = raw.find("[", i)
+        if j < 0:
+            break
+        is_image = j > i and raw[j - 1] == "!"
+        parsed = _try_parse_link(raw,
+                                 j - 1 if is_image else j,
+                                 is_image=is_image)
+        if not parsed:
+            # An image that fails to parse can't parse as a link either:
+            # both depend on the same brackets
+            i = j + 1
+            continue
+
+        start, end, label, href = parsed
+        flush_text(start)
+        nodes.append(
+            LinkNode(raw[start:end], label, href, is_image=is_image))
+        i = end
+        buffer_start = i
+
+    flush_text(n)
+    return nodes
 
-        if raw[i] == "[":
-            parsed = _try_parse_link(raw, i, is_image=False)
-            if parsed:
-                start, end, label, href = parsed
-                flush_text(start)
-                nodes.append(
-                    LinkNode(raw[start:end], label, href, is_image=False))
-                i = end
-                buffer_start = i
-                continue
 
-        i += 1
+class _InlineContainerNode(MarkdownNode):
+    """
+    A block whose children are the inline nodes parsed from its text.
 
-    flush_text(len(raw))
-    return nodes
+    The inlines are parsed the first time the children are looked at, so a
+    block that is only read back out as markdown never scans them.
+    """
+
+    __slots__ = ("_inlines",)
+
+    def __init__(self,
+                 node_type: NodeType,
+                 *,
+                 parent: Optional[MarkdownNode] = None) -> None:
+        super().__init__(node_type, parent=parent)
+        self._inlines: Optional[List[MarkdownNode]] = None
+
+    def _InlineSource(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def _children(self) -> List[MarkdownNode]:
+        if self._inlines is None:
+            self._inlines = _parse_inlines(self._InlineSource())
+            for c in self._inlines:
+                c._parent = self
+        return self._inlines
+
+    @_children.setter
+    def _children(self, children: List[MarkdownNode]) -> None:
+        self._inlines = children
+
+    @property
+    def Text(self) -> str:
+        plain = "".join(child.ToPlainText() for child in self._children)
+        return plain.strip()
 
 
-class ParagraphNode(MarkdownNode):
+class ParagraphNode(_InlineContainerNode):
+    __slots__ = ("_raw_original", "_block_suffix")
 
     def __init__(self,
                  raw_content: str,
@@ -406,24 +717,22 @@ class ParagraphNode(MarkdownNode):
         super().__init__(NodeType.Paragraph, parent=parent)
         self._raw_original = raw_content
         self._block_suffix = block_suffix
-        self._children = _parse_inlines(raw_content)
-        for c in self._children:
-            c._parent = self
 
-    @property
-    def Text(self) -> str:
-        plain = "".join(child.ToPlainText() for child in self._children)
-        return plain.strip()
+    def _InlineSource(self) -> str:
+        return self._raw_original
 
-    def ToMarkdown(self) -> str:
-        if not self._dirty_self and not any(c.IsDirty for c in self._children):
-            content = self._raw_original
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        # _dirty_subtree counts the dirty inline children
+        if not self._dirty_self and not self._dirty_subtree:
+            out.append(self._raw_original)
         else:
-            content = "".join(child.ToMarkdown() for child in self._children)
-        return content + self._block_suffix
+            for child in self._children:
+                child._WriteMarkdown(out)
+        out.append(self._block_suffix)
 
 
-class ListItemNode(MarkdownNode):
+class ListItemNode(_InlineContainerNode):
+    __slots__ = ("_raw_original", "_marker", "_indent", "_line_suffix")
 
     def __init__(self,
                  raw_content: str,
@@ -437,24 +746,24 @@ class ListItemNode(MarkdownNode):
         self._marker = marker
         self._indent = indent
         self._line_suffix = line_suffix
-        self._children = _parse_inlines(raw_content)
-        for c in self._children:
-            c._parent = self
 
-    @property
-    def Text(self) -> str:
-        plain = "".join(child.ToPlainText() for child in self._children)
-        return plain.strip()
+    def _InlineSource(self) -> str:
+        return self._raw_original
 
-    def ToMarkdown(self) -> str:
-        if not self._dirty_self and not any(c.IsDirty for c in self._children):
-            content = self._raw_original
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        out.append(self._indent)
+        out.append(self._marker)
+        # _dirty_subtree counts the dirty inline children
+        if not self._dirty_self and not self._dirty_subtree:
+            out.append(self._raw_original)
         else:
-            content = "".join(child.ToMarkdown() for child in self._children)
-        return f"{self._indent}{self._marker}{content}{self._line_suffix}"
+            for child in self._children:
+                child._WriteMarkdown(out)
+        out.append(self._line_suffix)
 
 
 class ListNode(MarkdownNode):
+    __slots__ = ("Ordered", "_block_suffix")
 
     def __init__(self,
                  ordered: bool,
@@ -465,12 +774,14 @@ class ListNode(MarkdownNode):
         self.Ordered = ordered
         self._block_suffix = block_suffix
 
-    def ToMarkdown(self) -> str:
-        return "".join(child.ToMarkdown()
-                       for child in self._children) + self._block_suffix
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        for child in self._children:
+            child._WriteMarkdown(out)
+        out.append(self._block_suffix)
 
 
-class BlockQuoteNode(MarkdownNode):
+class BlockQuoteNode(_InlineContainerNode):
+    __slots__ = ("_raw_lines", "_block_suffix")
 
     def __init__(self,
                  raw_lines: List[str],
@@ -480,21 +791,18 @@ class BlockQuoteNode(MarkdownNode):
         super().__init__(NodeType.BlockQuote, parent=parent)
         self._raw_lines = raw_lines
         self._block_suffix = block_suffix
-        content = "".join(re.sub(r"^>[ ]?", "", line) for line in raw_lines)
-        self._children = _parse_inlines(content)
-        for c in self._children:
-            c._parent = self
 
-    @property
-    def Text(self) -> str:
-        plain = "".join(child.ToPlainText() for child in self._children)
-        return plain.strip()
+    def _InlineSource(self) -> str:
+        return "".join(_BLOCKQUOTE_RE.sub("", line) for line in self._raw_lines)
 
-    def ToMarkdown(self) -> str:
-        return "".join(self._raw_lines) + self._block_suffix
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        out.extend(self._raw_lines)
+        out.append(self._block_suffix)
 
 
 class MarkdownDocument(MarkdownNode):
+    __slots__ = ("_leading_trivia", "_source_path", "_nodes_by_type",
+                 "_content_hash")
 
     def __init__(self,
                  markdown: str = "",
@@ -503,6 +811,12 @@ class MarkdownDocument(MarkdownNode):
         super().__init__(NodeType.Root, parent=None)
         self._leading_trivia: str = ""
         self._source_path = source_path
+        # Every node by type, in Walk order. Built by the first FindAll and
+        # dropped whenever a node is added.
+        self._nodes_by_type: Optional[dict[NodeType,
+                                           List[MarkdownNode]]] = None
+        # ContentHash() of the parsed source, until something is edited
+        self._content_hash: Optional[str] = None
         if markdown:
             self.Parse(markdown)
 
@@ -524,104 +838,101 @@ class MarkdownDocument(MarkdownNode):
 
     def Parse(self, markdown: str) -> None:
         self._children.clear()
-        self._leading_trivia = ""
+        self._dirty_subtree = 0
+        self._nodes_by_type = None
+        self._content_hash = None
+        # Parsing is lossless, so until something is edited the parsed
+        # source doubles as the serialised form.
+        self._source = markdown
+        self._span = (0, len(markdown))
 
         lines = markdown.splitlines(keepends=True)
+        # Offset of each line in the source, and of the end
+        starts = list(accumulate(map(len, lines), initial=0))
+        kinds, parts = _classify_lines(lines)
+        n_lines = len(lines)
+        # From here on lines are sliced back out of the source as they are
+        # needed, so the full list needn't stay alive alongside the nodes
+        del lines
+
+        def line_at(n: int) -> str:
+            return markdown[starts[n]:starts[n + 1]]
+
         i = 0
 
-        blank_line_re = re.compile(r"^[ \t]*\r?\n\Z")
-        heading_re = re.compile(
-            r"^(?P<indent>[ \t]*)(?P<hashes>#{1,6})(?P<space>[ \t]+)(?P<title>.*?)(?P<trailing>[ \t]*)(?P<eol>\r?\n)?\Z"
-        )
-        fence_open_re = re.compile(
-            r"^(?P<indent>[ \t]*)(?P<fence>`{3,}|~{3,})(?P<info>[^\r\n]*)(?P<eol>\r?\n)?\Z"
-        )
-        list_item_re = re.compile(
-            r"^(?P<indent>[ \t]*)(?P<marker>[-*+]|\d+\.)(?P<space>[ \t]+)(?P<content>.*?)(?P<eol>\r?\n)?\Z"
-        )
-        blockquote_re = re.compile(r"^>[ ]?")
-
-        def is_blank(line: str) -> bool:
-            return bool(blank_line_re.match(line))
-
-        def heading_match(line: str) -> Optional[re.Match]:
-            return heading_re.match(line)
-
-        def fence_open_match(line: str) -> Optional[re.Match]:
-            return fence_open_re.match(line)
-
-        while i < len(lines) and is_blank(lines[i]):
-            self._leading_trivia += lines[i]
-            i += 1
+        def append_block(node: MarkdownNode, first_line: int) -> None:
+            # Attach a block spanning first_line up to the current line
+            node._source = markdown
+            node._span = (starts[first_line], starts[i])
+            stack[-1]._AppendChildParsed(node)
+
+        def close_heading(node: MarkdownNode, end_line: int) -> None:
+            node._span = (node._span[0], starts[end_line])
+
+        def consume_blanks() -> str:
+            # Step over any blank lines, returning them
+            nonlocal i
+            start = i
+            while i < n_lines and kinds[i] == _LINE_BLANK:
+                i += 1
+            return markdown[starts[start]:starts[i]]
+
+        self._leading_trivia = consume_blanks()
 
         stack: List[MarkdownNode] = [self]
-        stack_levels: List[int] = [0]
+        stack_levels = array("b", [0])
 
-        while i < len(lines):
-            line = lines[i]
+        while i < n_lines:
+            line = line_at(i)
+
+            first_line = i
 
             # Code fence
-            fm = fence_open_match(line)
-            if fm:
+            if kinds[i] == _LINE_FENCE:
                 opening_line = line
-                fence = fm.group("fence")
-                fence_char = fence[0]
-                fence_len = len(fence)
+                fence_char, fence_len = parts[i]
                 i += 1
 
-                body_lines: List[str] = []
+                body_start = i
                 closing_line = ""
-                while i < len(lines):
-                    l2 = lines[i]
-                    mclose = re.match(
-                        rf"^[ \t]*{re.escape(fence_char)}{{{fence_len},}}[ \t]*[^\r\n]*\r?\n?\Z",
-                        l2,
-                    )
-                    if mclose:
+                while i < n_lines:
+                    l2 = line_at(i)
+                    if _is_close_fence(l2, fence_char, fence_len):
                         closing_line = l2
-                        i += 1
                         break
-                    body_lines.append(l2)
                     i += 1
 
                 if closing_line != "":
-                    code_body = "".join(body_lines)
-                    block_suffix = ""
-                    while i < len(lines) and is_blank(lines[i]):
-                        block_suffix += lines[i]
-                        i += 1
-                    stack[-1]._AppendChildParsed(
+                    # The body is a run of whole lines, so slice it out
+                    code_body = markdown[starts[body_start]:starts[i]]
+                    i += 1
+                    block_suffix = consume_blanks()
+                    append_block(
                         CodeBlockNode(opening_line, code_body, closing_line,
-                                      block_suffix))
+                                      block_suffix), first_line)
                     continue
 
                 # No closing fence: rewind and parse as paragraph
-                i = i - len(body_lines) - 1
-                line = lines[i]
+                i = first_line
 
             # Heading
-            hm = heading_match(line)
-            if hm:
-                level = len(hm.group("hashes"))
-                prefix = hm.group("indent") + hm.group("hashes") + hm.group(
-                    "space")
-                title_raw = hm.group("title")
-                line_suffix = hm.group("trailing") + (hm.group("eol") or "")
+            if kinds[i] == _LINE_HEADING:
+                level, prefix, title_raw, line_suffix = parts[i]
                 raw_line = line
                 i += 1
 
-                block_suffix = ""
-                while i < len(lines) and is_blank(lines[i]):
-                    block_suffix += lines[i]
-                    i += 1
+                block_suffix = consume_blanks()
 
+                # The section ends where the next heading at its level starts
                 while stack_levels and stack_levels[-1] >= level:
-                    stack.pop()
+                    close_heading(stack.pop(), first_line)
                     stack_levels.pop()
 
                 parent = stack[-1]
                 heading_node = HeadingNode(level, raw_line, prefix, title_raw,
                                            line_suffix, block_suffix)
+                heading_node._source = markdown
+                heading_node._span = (starts[first_line], -1)
                 parent._AppendChildParsed(heading_node)
 
                 stack.append(heading_node)
@@ -629,85 +940,81 @@ class MarkdownDocument(MarkdownNode):
                 continue
 
             # BlockQuote
-            if blockquote_re.match(line):
+            if kinds[i] == _LINE_QUOTE:
                 quote_lines: List[str] = [line]
                 i += 1
-                while i < len(lines):
-                    if is_blank(lines[i]):
-                        break
-                    if not blockquote_re.match(lines[i]):
-                        break
-                    quote_lines.append(lines[i])
+                while i < n_lines and kinds[i] == _LINE_QUOTE:
+                    quote_lines.append(line_at(i))
                     i += 1
 
-                block_suffix = ""
-                while i < len(lines) and is_blank(lines[i]):
-                    block_suffix += lines[i]
-                    i += 1
+                block_suffix = consume_blanks()
 
-                stack[-1]._AppendChildParsed(
-                    BlockQuoteNode(quote_lines, block_suffix))
+                append_block(BlockQuoteNode(quote_lines, block_suffix),
+                             first_line)
                 continue
 
             # List
-            lm = list_item_re.match(line)
-            if lm:
-                first_marker = lm.group("marker")
-                ordered = first_marker[-1] == "."
+            if kinds[i] == _LINE_LIST_ITEM:
+                ordered = parts[i][1][-1] == "."
                 list_items: List[ListItemNode] = []
 
-                while i < len(lines):
-                    lm2 = list_item_re.match(lines[i])
-                    if not lm2:
-                        break
-                    marker2 = lm2.group("marker")
-                    is_ordered2 = marker2[-1] == "."
-                    if is_ordered2 != ordered:
+                while i < n_lines and kinds[i] == _LINE_LIST_ITEM:
+                    indent, marker, space, content, eol = parts[i]
+                    if (marker[-1] == ".") != ordered:
                         break
-                    indent = lm2.group("indent")
-                    marker = lm2.group("marker") + lm2.group("space")
-                    content = lm2.group("content")
-                    eol = lm2.group("eol") or ""
+                    marker += space
                     list_items.append(
-                        ListItemNode(content, marker, indent, eol))
+                        ListItemNode(content, _intern_trivia(marker, marker),
+                                     indent, eol))
                     i += 1
 
-                block_suffix = ""
-                while i < len(lines) and is_blank(lines[i]):
-                    block_suffix += lines[i]
-                    i += 1
+                block_suffix = consume_blanks()
 
                 list_node = ListNode(ordered, block_suffix)
                 for item in list_items:
                     list_node._AppendChildParsed(item)
-                stack[-1]._AppendChildParsed(list_node)
+                append_block(list_node, first_line)
                 continue
 
             # Paragraph
-            para_lines: List[str] = [line]
             i += 1
-            while i < len(lines):
-                if is_blank(lines[i]):
-                    break
-                if heading_match(lines[i]):
-                    break
-                if fence_open_match(lines[i]):
-                    break
-                if list_item_re.match(lines[i]):
-                    break
-                if blockquote_re.match(lines[i]):
-                    break
-                para_lines.append(lines[i])
+            # Any line that could start another block ends the paragraph
+            while i < n_lines and kinds[i] == _LINE_TEXT:
                 i += 1
 
-            raw_para = "".join(para_lines)
-            block_suffix = ""
-            while i < len(lines) and is_blank(lines[i]):
-                block_suffix += lines[i]
-                i += 1
+            raw_para = markdown[starts[first_line]:starts[i]]
+            block_suffix = consume_blanks()
 
-            stack[-1]._AppendChildParsed(ParagraphNode(raw_para, block_suffix))
+            append_block(ParagraphNode(raw_para, block_suffix), first_line)
 
-    def ToMarkdown(self) -> str:
-        return self._leading_trivia + "".join(child.ToMarkdown()
-                                              for child in self._children)
+        while len(stack) > 1:
+            close_heading(stack.pop(), n_lines)
+
+    def _WriteMarkdown(self, out: List[str]) -> None:
+        out.append(self._leading_trivia)
+        for child in self._children:
+            child._WriteMarkdown(out)
+
+    def FindAll(self, node_type: NodeType) -> Iterator[MarkdownNode]:
+        if self._nodes_by_type is None:
+            nodes_by_type: dict[NodeType, List[MarkdownNode]] = {}
+            for node in self.Walk():
+                nodes_by_type.setdefault(node.Type, []).append(node)
+            self._nodes_by_type = nodes_by_type
+        return iter(self._nodes_by_type.get(node_type, ()))
+
+    def _StructureChanged(self) -> None:
+        self._nodes_by_type = None
+
+    def ContentHash(self) -> str:
+        """
+        Hex digest of the document's markdown, for use as a cache key.
+        Only computed once while the document is unedited.
+        """
+        if self._content_hash is not None and not self.IsDirty:
+            return self._content_hash
+        digest = hashlib.blake2b(self.ToMarkdown().encode("utf-8"),
+                                 digest_size=16).hexdigest()
+        if not self.IsDirty:
+            self._content_hash = digest
+        return digest
@@ -6,12 +6,16 @@ from __future__ import annotations
 
 import json
 import os
+import time
+from email.utils import parsedate_to_datetime
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from llm_session import (
     BadOutputError,
     LLMConfig,
+    LLMError,
     LLMSession,
     Message,
     NetworkError,
@@ -23,11 +27,31 @@ from llm_session import (
 
 try:
     import openai
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
     OpenAI = None
+    AsyncOpenAI = None
+
+# Schema instruction text by id(schema). Schemas are module-level constants
+# that are never modified, and each entry holds a reference to its schema
+# so the id can't be reused while it is cached.
+_SCHEMA_INSTRUCTIONS: Dict[int, Tuple[Dict[str, Any], str]] = {}
+_SCHEMA_INSTRUCTIONS_MAX = 64
+
+
+def _schema_instruction(schema: Dict[str, Any]) -> str:
+    """The "respond with JSON matching..." suffix for a schema."""
+    entry = _SCHEMA_INSTRUCTIONS.get(id(schema))
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+
+    text = f"\n\nRespond with valid JSON matching this schema:\n```json\n{json.dumps(schema, indent=2)}\n```"
+    if len(_SCHEMA_INSTRUCTIONS) >= _SCHEMA_INSTRUCTIONS_MAX:
+        _SCHEMA_INSTRUCTIONS.clear()
+    _SCHEMA_INSTRUCTIONS[id(schema)] = (schema, text)
+    return text
 
 
 class OpenAIChatSession(LLMSession):
@@ -43,7 +67,13 @@ class OpenAIChatSession(LLMSession):
         system_prompt: str = "",
         allowed_read_paths: Optional[List[Path]] = None,
         allowed_write_paths: Optional[List[Path]] = None,
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None,
     ):
+        """
+        `client`/`async_client` may be passed to share one pair of OpenAI
+        clients (and their connection pools) between sessions.
+        """
         super().__init__(
             config=config,
             system_prompt=system_prompt,
@@ -63,31 +93,27 @@ class OpenAIChatSession(LLMSession):
                 "OpenAI API key required. Set OPENAI_API_KEY env var or pass api_key parameter."
             )
 
-        self.client = OpenAI(api_key=self.api_key)
-
-    def _message_to_openai(self, msg: Message) -> Dict[str, Any]:
-        """Convert internal Message to OpenAI format."""
-        result: Dict[str, Any] = {
-            "role": msg.role.value,
-            "content": msg.content or "",
-        }
-
-        if msg.tool_calls:
-            result["tool_calls"] = msg.tool_calls
+        self.client = client or OpenAI(api_key=self.api_key)
+        self.async_client = async_client or AsyncOpenAI(api_key=self.api_key)
 
-        if msg.role == Role.TOOL:
-            result["tool_call_id"] = msg.tool_call_id
-            if msg.name:
-                result["name"] = msg.name
-
-        return result
+        # (tools version, spec) from the last _get_tools_spec call
+        self._tools_spec_cache: Tuple[int, List[Dict[str, Any]]] = (-1, [])
+        # Wire format of self.messages, extended as messages are appended
+        # and rebuilt when the history version changes
+        self._api_history: List[Dict[str, Any]] = []
+        self._api_history_version = -1
 
     def _get_tools_spec(self) -> List[Dict[str, Any]]:
-        """Get OpenAI tools specification."""
-        if not self.tools:
-            return []
+        """
+        Get OpenAI tools specification.
+
+        Rebuilt only when a tool has been registered since the last call.
+        """
+        version, spec = self._tools_spec_cache
+        if version == self._tools_version:
+            return spec
 
-        return [{
+        spec = [{
             "type": "function",
             "function": {
                 "name": tool.name,
@@ -95,113 +121,252 @@ class OpenAIChatSession(LLMSession):
                 "parameters": tool.parameters,
             }
         } for tool in self.tools.values()]
+        self._tools_spec_cache = (self._tools_version, spec)
+        return spec
+
+    def _sync_api_history(self) -> List[Dict[str, Any]]:
+        """The wire format of self.messages, converting only new messages."""
+        if self._api_history_version != self._history_version:
+            self._api_history = []
+            self._api_history_version = self._history_version
+
+        api_history = self._api_history
+        new = len(self.messages) - len(api_history)
+        if new > 0:
+            tail = [
+                m.to_api_dict()
+                for m in islice(reversed(self.messages), new)
+            ]
+            api_history.extend(reversed(tail))
+        return api_history
+
+    def _api_messages(self, messages: Sequence[Message]) -> List[Dict[str, Any]]:
+        """
+        Wire format of `messages`.
+
+        build_messages() returns the history itself, or the history followed
+        by dynamic context; either way the history part comes from
+        _sync_api_history() rather than being converted again. The returned
+        list must not be modified.
+        """
+        history = self.messages
+        n = len(history)
+        if messages is history:
+            return self._sync_api_history()
+        if (n and len(messages) >= n and messages[0] is history[0]
+                and messages[n - 1] is history[-1]):
+            return self._sync_api_history() + [
+                m.to_api_dict() for m in messages[n:]
+            ]
+        return [m.to_api_dict() for m in messages]
+
+    def _chat_kwargs(self,
+                     messages: List[Message],
+                     include_tools: bool = True) -> Dict[str, Any]:
+        """Build chat.completions.create() arguments for a plain chat turn."""
+        kwargs = {
+            "model": self.model,
+            "messages": self._api_messages(messages),
+            "max_tokens": self.config.max_tokens,
+            "temperature": self.config.temperature,
+        }
 
-    def _call_api(self, messages: List[Message]) -> Message:
-        """Make the actual OpenAI API call."""
-        openai_messages = [self._message_to_openai(m) for m in messages]
-        tools = self._get_tools_spec()
+        tools = self._get_tools_spec() if include_tools else []
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
 
-        try:
-            kwargs = {
-                "model": self.model,
-                "messages": openai_messages,
-                "max_tokens": self.config.max_tokens,
-                "temperature": self.config.temperature,
-            }
+        return kwargs
 
-            if tools:
-                kwargs["tools"] = tools
-                kwargs["tool_choice"] = "auto"
-
-            response = self.client.chat.completions.create(**kwargs)
-
-            choice = response.choices[0]
-            message = choice.message
-
-            # Extract tool calls if present
-            tool_calls = None
-            if message.tool_calls:
-                tool_calls = [{
-                    "id": tc.id,
-                    "type": "function",
-                    "function": {
-                        "name": tc.function.name,
-                        "arguments": tc.function.arguments,
-                    }
-                } for tc in message.tool_calls]
-
-            return Message(
-                role=Role.ASSISTANT,
-                content=message.content or "",
-                tool_calls=tool_calls,
-            )
+    def _structured_kwargs(self, messages: List[Message],
+                           schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Build chat.completions.create() arguments for a JSON turn."""
+        # Add schema instruction to the last user message
+        schema_instruction = _schema_instruction(schema)
+
+        # Swap in a copy of the last user message with the schema instruction
+        api_messages = self._api_messages(messages)
+        if messages and messages[-1].role == Role.USER:
+            last_msg = messages[-1]
+            api_messages = api_messages[:-1]
+            api_messages.append(
+                Message(
+                    role=last_msg.role,
+                    content=last_msg.content + schema_instruction,
+                ).to_api_dict())
+
+        return {
+            "model": self.model,
+            "messages": api_messages,
+            "max_tokens": self.config.max_tokens,
+            "temperature": self.config.temperature,
+            "response_format": {
+                "type": "json_object"
+            },
+        }
 
-        except openai.RateLimitError as e:
-            raise RateLimitError(str(e)) from e
-        except openai.AuthenticationError as e:
-            raise OutOfCreditsError(
-                f"Authentication failed (possibly out of credits): {e}") from e
-        except openai.APIConnectionError as e:
-            raise NetworkError(str(e)) from e
-        except openai.BadRequestError as e:
+    @staticmethod
+    def _parse_chat_response(response: Any) -> Message:
+        """Convert a chat completion into an assistant Message."""
+        choice = response.choices[0]
+        message = choice.message
+
+        # Extract tool calls if present
+        tool_calls = None
+        if message.tool_calls:
+            tool_calls = [{
+                "id": tc.id,
+                "type": "function",
+                "function": {
+                    "name": tc.function.name,
+                    "arguments": tc.function.arguments,
+                }
+            } for tc in message.tool_calls]
+
+        return Message(
+            role=Role.ASSISTANT,
+            content=message.content or "",
+            tool_calls=tool_calls,
+        )
+
+    @staticmethod
+    def _parse_structured_response(response: Any) -> Dict[str, Any]:
+        content = response.choices[0].message.content
+
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError as e:
+            raise BadOutputError(
+                f"Failed to parse JSON response: {e}\nContent: {content[:500]}"
+            ) from e
+
+    @staticmethod
+    def _retry_after(e: Exception) -> Optional[float]:
+        """Seconds the server asked us to wait before retrying, if it said."""
+        response = getattr(e, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if value is None:
+                return None
+            try:
+                return float(value)
+            except ValueError:
+                # Retry-After may also be an HTTP date
+                return max(
+                    0.0,
+                    parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _translate_error(e: Exception) -> Optional[LLMError]:
+        """Map an OpenAI SDK exception onto our LLMError hierarchy."""
+        if isinstance(e, openai.RateLimitError):
+            return RateLimitError(str(e),
+                                  OpenAIChatSession._retry_after(e))
+        if isinstance(e, openai.AuthenticationError):
+            return OutOfCreditsError(
+                f"Authentication failed (possibly out of credits): {e}")
+        if isinstance(e, openai.APIConnectionError):
+            return NetworkError(str(e))
+        if isinstance(e, openai.BadRequestError):
             # Could be content policy violation
             error_msg = str(e).lower()
             if "content" in error_msg and ("policy" in error_msg
                                            or "filter" in error_msg):
-                raise SafetyFilterError(str(e)) from e
-            raise BadOutputError(str(e)) from e
+                return SafetyFilterError(str(e))
+            return BadOutputError(str(e))
+        return None
+
+    def _call_api(self, messages: List[Message]) -> Message:
+        """Make the actual OpenAI API call."""
+        try:
+            response = self.client.chat.completions.create(
+                **self._chat_kwargs(messages))
+            return self._parse_chat_response(response)
         except Exception as e:
-            raise NetworkError(f"Unexpected error: {e}") from e
+            raise (self._translate_error(e)
+                   or NetworkError(f"Unexpected error: {e}")) from e
+
+    def _stream_api(self, messages: List[Message]) -> Iterator[str]:
+        """Open a streaming completion and return its text chunks."""
+        try:
+            stream = self.client.chat.completions.create(
+                stream=True, **self._chat_kwargs(messages, include_tools=False))
+        except Exception as e:
+            raise (self._translate_error(e)
+                   or NetworkError(f"Unexpected error: {e}")) from e
+
+        return self._iter_stream(stream)
+
+    def _iter_stream(self, stream: Any) -> Iterator[str]:
+        try:
+            for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        except Exception as e:
+            raise (self._translate_error(e)
+                   or NetworkError(f"Unexpected error: {e}")) from e
+        finally:
+            stream.close()
+
+    def _stream_api_structured(self, messages: List[Message],
+                               schema: Dict[str, Any]) -> Iterator[str]:
+        """Open a streaming JSON completion and return its text chunks."""
+        try:
+            stream = self.client.chat.completions.create(
+                stream=True, **self._structured_kwargs(messages, schema))
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is None:
+                raise
+            raise error from e
+
+        return self._iter_stream(stream)
 
     def _call_api_structured(self, messages: List[Message],
                              schema: Dict[str, Any]) -> Dict[str, Any]:
         """Make API call expecting structured JSON output."""
-        # Add schema instruction to the last user message
-        schema_instruction = f"\n\nRespond with valid JSON matching this schema:\n```json\n{json.dumps(schema, indent=2)}\n```"
-
-        # Create modified messages with schema instruction
-        modified_messages = messages.copy()
-        if modified_messages and modified_messages[-1].role == Role.USER:
-            last_msg = modified_messages[-1]
-            modified_messages[-1] = Message(
-                role=last_msg.role,
-                content=last_msg.content + schema_instruction,
-            )
+        try:
+            response = self.client.chat.completions.create(
+                **self._structured_kwargs(messages, schema))
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is None:
+                raise
+            raise error from e
 
-        openai_messages = [
-            self._message_to_openai(m) for m in modified_messages
-        ]
+        return self._parse_structured_response(response)
 
+    async def _acall_api(self, messages: List[Message]) -> Message:
+        """Async OpenAI API call on the shared AsyncOpenAI client."""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=openai_messages,
-                max_tokens=self.config.max_tokens,
-                temperature=self.config.temperature,
-                response_format={"type": "json_object"},
-            )
+            response = await self.async_client.chat.completions.create(
+                **self._chat_kwargs(messages))
+            return self._parse_chat_response(response)
+        except Exception as e:
+            raise (self._translate_error(e)
+                   or NetworkError(f"Unexpected error: {e}")) from e
 
-            content = response.choices[0].message.content
+    async def _acall_api_structured(self, messages: List[Message],
+                                    schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Async API call expecting structured JSON output."""
+        try:
+            response = await self.async_client.chat.completions.create(
+                **self._structured_kwargs(messages, schema))
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is None:
+                raise
+            raise error from e
 
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError as e:
-                raise BadOutputError(
-                    f"Failed to parse JSON response: {e}\nContent: {content[:500]}"
-                ) from e
-
-        except openai.RateLimitError as e:
-            raise RateLimitError(str(e)) from e
-        except openai.AuthenticationError as e:
-            raise OutOfCreditsError(f"Authentication failed: {e}") from e
-        except openai.APIConnectionError as e:
-            raise NetworkError(str(e)) from e
-        except openai.BadRequestError as e:
-            error_msg = str(e).lower()
-            if "content" in error_msg and ("policy" in error_msg
-                                           or "filter" in error_msg):
-                raise SafetyFilterError(str(e)) from e
-            raise BadOutputError(str(e)) from e
+        return self._parse_structured_response(response)
 
 
 def create_session(
@@ -0,0 +1,18 @@
+import json
+
+from gistpplib.Tests import _load_tests, _package_tests
+
+
+def test_package_round_trip():
+  tests = [{"name": "a", "type": "contract", "description": "d", "pseudocode": "p" * 10}]
+  assert _load_tests(_package_tests(tests, "abc")) == ("abc", tests)
+
+
+def test_legacy_list_is_stale():
+  tests = [{"name": "a", "type": "unit", "description": "d", "pseudocode": "p" * 10}]
+  assert _load_tests(json.dumps(tests)) == (None, tests)
+
+
+def test_empty_plan():
+  assert _load_tests("") == (None, [])
+  assert _load_tests("[]") == (None, [])